@@ -0,0 +1,126 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Solving many boards at once on several cores.
+#
+#     for index, actions in solve_many(boards, workers=4):
+#         ...
+#
+# From the command line, boards are read as JSON lines (one 2D list per
+# line) on stdin and the solutions are written as JSON lines on stdout:
+#
+#     python batch.py --workers 4 --ordered < boards.jsonl > solutions.jsonl
+
+import argparse # Used by the command line tool
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from engine import shape_of
+from puzzle import solve
+from stats import BUDGET_EXCEEDED, Stats
+import oracle
+import search
+
+TIMEOUT = "TIMEOUT" # Result of a board that took longer than the time limit
+ERROR = "ERROR" # Result of a board that made the solver fail
+
+def _prepare(board, method):
+    '''Loads (or builds) the tables BOARD will be solved with, once per
+    process, so that the time limit only covers the search itself.'''
+    shape = shape_of(board)
+    if (method or search.choose_solver(shape)) == "oracle":
+        oracle.get_table(shape)
+    elif method not in ("bfs", "bidirectional"):
+        search.get_heuristic(shape)
+
+def _solve_one(board, method, timeout):
+    '''Returns solve(BOARD), TIMEOUT or ERROR.'''
+    try:
+        _prepare(board, method)
+        stats = Stats(max_seconds=timeout, interval=1024) if timeout else None
+        result = solve(board, method, stats=stats)
+    except Exception:
+        return ERROR
+    return TIMEOUT if result == BUDGET_EXCEEDED else result
+
+def _solve_chunk(chunk, method, timeout):
+    '''Solves every (key, board) pair of CHUNK and returns (key, result) pairs.'''
+    return [(key, _solve_one(board, method, timeout)) for key, board in chunk]
+
+def solve_many(boards, workers=None, ordered=False, method=None, timeout=None, chunksize=16):
+    '''Solves every board of BOARDS and yields (index, result) pairs, where
+    INDEX is the position of the board in BOARDS and RESULT is what
+    solve() returns for it, TIMEOUT if it took more than TIMEOUT seconds
+    or ERROR if the solver failed on it.
+
+    Identical boards are solved only once. The distinct boards are sent to
+    WORKERS processes (all cores by default) in chunks of CHUNKSIZE.
+    Results are yielded as soon as their chunk is done, or in the order of
+    BOARDS if ORDERED is True. With WORKERS=1 everything runs in this
+    process.'''
+    boards = list(boards)
+    indices = {} # board key -> indices of the boards with this key
+    unique = []
+    for index, board in enumerate(boards):
+        key = tuple(tuple(row) for row in board)
+        if key not in indices:
+            indices[key] = []
+            unique.append((key, board))
+        indices[key].append(index)
+    chunks = [unique[i:i + chunksize] for i in range(0, len(unique), chunksize)]
+    done = {} # index -> result, for results held back by ORDERED
+    next_index = 0
+
+    def finish(pairs):
+        '''Yields the results of a finished chunk.'''
+        nonlocal next_index
+        for key, result in pairs:
+            for index in indices[key]:
+                if not ordered:
+                    yield index, result
+                else:
+                    done[index] = result
+        while ordered and next_index in done:
+            yield next_index, done.pop(next_index)
+            next_index += 1
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from finish(_solve_chunk(chunk, method, timeout))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep only a few chunks per worker in flight so huge batches
+        # do not all sit in the pool's queue at once.
+        pending = set()
+        chunks = iter(chunks)
+        for chunk in chunks:
+            pending.add(pool.submit(_solve_chunk, chunk, method, timeout))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield from finish(future.result())
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(pool.submit(_solve_chunk, chunk, method, timeout))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve boards read as JSON lines from stdin.")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--ordered", action="store_true", help="write solutions in input order")
+    parser.add_argument("--method", default=None, help="solver name, see search.SOLVERS")
+    parser.add_argument("--timeout", type=float, default=None, help="time limit per board in seconds")
+    parser.add_argument("--chunksize", type=int, default=16)
+    args = parser.parse_args(argv)
+    boards = [json.loads(line) for line in sys.stdin if line.strip()]
+    for index, result in solve_many(boards, args.workers, args.ordered, args.method, args.timeout, args.chunksize):
+        print(json.dumps({"index": index, "solution": result}), flush=True)
+
+if __name__ == '__main__':
+    main()
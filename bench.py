@@ -0,0 +1,245 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Benchmarks for the solvers in search.SOLVERS.
+#
+# The boards come from a fixed corpus (bench/corpus.json), grouped by the
+# length of their shortest solution, so slow deep boards cannot hide among
+# easy ones. For each board size, solver and depth group the benchmark
+# reports p50/p95/p99 latency over BOARDS_PER_GROUP boards, and the states
+# expanded, states expanded per second and peak memory on the first
+# MEASURED_BOARDS of them.
+#
+# The informed solvers use Manhattan distance plus linear conflicts, so the
+# figures do not depend on which pattern databases happen to be in PDB_DIR;
+# --heuristic default uses the same heuristic as solve() instead. Either
+# way, the heuristic is recorded with the results.
+#
+#     python bench.py corpus                             # regenerate the corpus
+#     python bench.py run -o results.json                # run the benchmarks
+#     python bench.py run --baseline bench/baseline.json # ... and compare
+#
+# A comparison fails when a latency, node count or memory figure is more
+# than THRESHOLD (20% by default) worse than in the baseline. The process
+# then exits with status 1; latencies less than --min-ms and peak memory
+# less than --min-kib worse never count. A baseline is only compared with
+# runs of the same --heuristic and --repeat. Latencies in
+# bench/baseline.json were measured on one machine; elsewhere, compare
+# only "--figures nodes,peak_kib" or write a baseline of your own.
+
+import argparse # Used by the command line tool
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc # Used to measure peak memory
+import search
+from engine import get_shape
+from stats import Stats, percentile
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench", "corpus.json")
+BASELINE = os.path.join(os.path.dirname(CORPUS), "baseline.json")
+SIZES = {
+    # size: (depth groups, solvers to benchmark)
+    "3x3": ([(0, 7), (8, 15), (16, 23), (24, 31)], ["oracle", "astar", "idastar", "bidirectional", "bfs"]),
+    "3x4": ([(0, 9), (10, 19), (20, 29), (30, 39)], ["astar", "idastar", "bidirectional"]),
+    "4x4": ([(0, 9), (10, 19), (20, 29), (30, 39)], ["idastar", "astar"]),
+}
+BOARDS_PER_GROUP = 100
+MEASURED_BOARDS = 10 # Boards per group also run with statistics and memory tracing
+BOARD_SECONDS = 0.25 # A board is timed again until this much time was spent on it
+FIGURES = ("p50_ms", "p95_ms", "p99_ms", "nodes", "peak_kib")
+
+def make_corpus(seed=2019):
+    '''Returns a corpus {size: {"lo-hi": [tiles, ...]}} with BOARDS_PER_GROUP
+    boards for every depth group of SIZES.'''
+    rng = random.Random(seed)
+    corpus = {}
+    for size, (groups, solvers) in SIZES.items():
+        shape = get_shape(*map(int, size.split("x")))
+        corpus[size] = {}
+        for lo, hi in groups:
+            boards = []
+            while len(boards) < BOARDS_PER_GROUP:
+                # A walk that never undoes its last move rarely ends much
+                # shallower than its length. Lengths vary, as a walk of odd
+                # length can only end at an odd depth.
+                state, zero, previous = shape.goal, shape.goal_zero, None
+                for step in range(rng.randint(max(lo, 1), hi)):
+                    new_zero = rng.choice([pos for action, pos in shape.moves[zero] if pos != previous])
+                    state, zero, previous = shape.move(state, zero, new_zero), new_zero, zero
+                depth = len(search.SOLVERS[search.choose_solver(shape)](shape, state, zero))
+                tiles = shape.unpack_tiles(state)
+                if lo <= depth <= hi and tiles not in boards:
+                    boards.append(tiles)
+            corpus[size]["{}-{}".format(lo, hi)] = boards
+    return corpus
+
+def get_heuristic(shape, heuristic="manhattan"):
+    '''Returns the heuristic named HEURISTIC for SHAPE: "manhattan" for
+    Manhattan distance plus linear conflicts, "default" for the one
+    solve() would use.'''
+    if heuristic == "manhattan":
+        return search.ManhattanConflict(shape)
+    return search.get_heuristic(shape)
+
+def fresh(heuristic, shape):
+    '''Returns HEURISTIC with nothing memoized yet, so that the memory a
+    search uses does not depend on what earlier searches left behind.'''
+    if isinstance(heuristic, search.ManhattanConflict):
+        return search.ManhattanConflict(shape)
+    return heuristic # Pattern databases are read-only tables.
+
+def describe(heuristic):
+    '''Returns a short name of HEURISTIC, e.g. "pdb 6-6-3".'''
+    if isinstance(heuristic, search.ManhattanConflict):
+        return "manhattan+conflicts"
+    return "pdb " + "-".join(str(len(pattern)) for pattern in heuristic.patterns)
+
+def run(corpus, sizes=None, solvers=None, repeat=5, progress=None, heuristic="manhattan"):
+    '''Benchmarks the solvers on CORPUS and returns the results as a dict
+    {size: {solver: {group: figures}}}. The latency is measured in a pass
+    of its own, without statistics or memory tracing. The latency of a
+    board is the best of REPEAT runs, or of fewer once BOARD_SECONDS were
+    spent on it, which keeps one-off pauses of the machine out of the
+    percentiles. Memory is measured with a fresh heuristic for every
+    board, as the one used for timing has memoized the earlier boards.'''
+    results = {}
+    for size in sizes or corpus:
+        shape = get_shape(*map(int, size.split("x")))
+        estimator = get_heuristic(shape, heuristic)
+        results[size] = {}
+        for name in solvers or SIZES[size][1]:
+            solver = search.SOLVERS[name]
+            solver(shape, shape.goal, shape.goal_zero, estimator) # Warm up tables and caches.
+            results[size][name] = {}
+            for group, boards in corpus[size].items():
+                samples = [] # Best time of each board
+                for tiles in boards:
+                    state, zero = shape.pack_tiles(tiles)
+                    best, spent = None, 0.0
+                    for i in range(repeat):
+                        start = time.perf_counter()
+                        solver(shape, state, zero, estimator)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                        spent += elapsed
+                        if spent > BOARD_SECONDS:
+                            break
+                    samples.append(best)
+                nodes, peak = 0, 0
+                for tiles in boards[:MEASURED_BOARDS]:
+                    stats = Stats()
+                    state, zero = shape.pack_tiles(tiles)
+                    measured = fresh(estimator, shape)
+                    tracemalloc.start()
+                    solver(shape, state, zero, measured, stats=stats)
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                    nodes += stats.expanded
+                seconds = sum(samples[:MEASURED_BOARDS])
+                results[size][name][group] = {
+                    "boards": len(boards),
+                    "heuristic": describe(estimator) if name in ("astar", "idastar", "anytime") else None,
+                    "p50_ms": 1000 * percentile(samples, 50),
+                    "p95_ms": 1000 * percentile(samples, 95),
+                    "p99_ms": 1000 * percentile(samples, 99),
+                    "nodes": nodes,
+                    "nodes_per_s": nodes / seconds if seconds else 0.0,
+                    "peak_kib": peak / 1024,
+                }
+                if progress:
+                    progress(size, name, group, results[size][name][group])
+    return results
+
+def compare(results, baseline, threshold=0.2, min_ms=1.0, figures=FIGURES, min_kib=16.0):
+    '''Returns a list of messages describing every one of FIGURES in
+    RESULTS that is more than THRESHOLD worse than in BASELINE. Empty means
+    passed. Latencies that grew by less than MIN_MS milliseconds are timer
+    noise and peak memory that grew by less than MIN_KIB KiB is allocator
+    noise; neither counts as a regression.'''
+    regressions = []
+    for size, solvers in results.items():
+        for name, groups in solvers.items():
+            for group, new in groups.items():
+                old = baseline.get(size, {}).get(name, {}).get(group)
+                if old is None:
+                    continue
+                for key in figures:
+                    if key.endswith("_ms") and new[key] - old[key] < min_ms:
+                        continue
+                    if key == "peak_kib" and new[key] - old[key] < min_kib:
+                        continue
+                    if old[key] and new[key] > old[key] * (1 + threshold):
+                        regressions.append("{} {} depth {}: {} {:.3f} -> {:.3f} (+{:.0f}%)".format(
+                            size, name, group, key, old[key], new[key], 100 * (new[key] / old[key] - 1)))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sliding puzzle solvers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("corpus", help="regenerate the benchmark corpus")
+    make.add_argument("-o", "--output", default=CORPUS)
+    make.add_argument("--seed", type=int, default=2019)
+    bench = commands.add_parser("run", help="run the benchmarks")
+    bench.add_argument("--corpus", default=CORPUS)
+    bench.add_argument("--sizes", help='comma separated, e.g. "3x3,3x4"')
+    bench.add_argument("--solvers", help='comma separated, e.g. "astar,idastar"')
+    bench.add_argument("--repeat", type=int, default=5, help="timed runs per board; the best one counts")
+    bench.add_argument("--heuristic", choices=["manhattan", "default"], default="manhattan",
+                       help="heuristic of A* and IDA*: Manhattan + linear conflicts, or what solve() uses")
+    bench.add_argument("-o", "--output", help="write the results to this JSON file")
+    bench.add_argument("--baseline", nargs="?", const=BASELINE, help="compare against this results file (default: %(const)s)")
+    bench.add_argument("--figures", default=",".join(FIGURES), help="comma separated figures to compare")
+    bench.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    bench.add_argument("--min-ms", type=float, default=1.0, help="ignore latency changes below this")
+    bench.add_argument("--min-kib", type=float, default=16.0, help="ignore peak memory changes below this")
+    args = parser.parse_args(argv)
+
+    if args.command == "corpus":
+        corpus = make_corpus(args.seed)
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(corpus, f)
+        print("Wrote", args.output)
+        return 0
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+
+    def progress(size, name, group, figures):
+        print("{:4} {:13} depth {:6} p50 {:9.3f}ms p95 {:9.3f}ms p99 {:9.3f}ms {:10.0f} nodes/s {:9.1f} KiB".format(
+            size, name, group, figures["p50_ms"], figures["p95_ms"], figures["p99_ms"],
+            figures["nodes_per_s"], figures["peak_kib"]))
+
+    sizes = args.sizes.split(",") if args.sizes else None
+    solvers = args.solvers.split(",") if args.solvers else None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("heuristic") != args.heuristic:
+            print("The baseline was measured with --heuristic {}.".format(baseline.get("heuristic")))
+            return 2
+        if baseline.get("repeat") != args.repeat:
+            print("The baseline was measured with --repeat {}.".format(baseline.get("repeat")))
+            return 2
+    results = run(corpus, sizes, solvers, args.repeat, progress, args.heuristic)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": platform.python_version(), "heuristic": args.heuristic, "repeat": args.repeat,
+                       "results": results}, f, indent=1)
+    if args.baseline:
+        regressions = compare(results, baseline["results"], args.threshold, args.min_ms, args.figures.split(","), args.min_kib)
+        for message in regressions:
+            print("REGRESSION:", message)
+        print("FAILED" if regressions else "PASSED", "against", args.baseline)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
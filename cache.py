@@ -0,0 +1,134 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# A bounded cache of solutions, shared by boards that mirror each other.
+#
+# On square boards, reflecting a board in its main diagonal and renaming
+# every tile after the tile whose goal cell is the reflection of its own
+# gives a board exactly as far from the goal: "up" becomes "left", "down"
+# becomes "right" and vice versa. Both boards are stored under the smaller
+# of their two packed states, so each one is a hit for the other.
+#
+# Every suffix of a shortest solution is a shortest solution of the board
+# it starts from, so put() stores every board along the solution.
+# Solutions are kept 4 moves per byte, and the least recently used ones
+# are dropped once the cache holds more than MAX_BYTES.
+#
+#     cache = SolutionCache(max_bytes=64 << 20)
+#     actions = puzzle.solve(board, cache=cache)
+
+from collections import OrderedDict
+from engine import ACTIONS
+
+ENTRY_OVERHEAD = 120 # Rough bytes of bookkeeping per entry (dict slot, key, bytes object)
+TRANSPOSED = {"up": "left", "left": "up", "down": "right", "right": "down"}
+
+def encode(actions):
+    '''Returns ACTIONS packed 4 per byte.'''
+    data = bytearray((len(actions) + 3) // 4)
+    for i, action in enumerate(actions):
+        data[i >> 2] |= ACTIONS.index(action) << 2 * (i & 3)
+    return bytes(data)
+
+def decode(data, length):
+    '''Inverse of encode().'''
+    return [ACTIONS[data[i >> 2] >> 2 * (i & 3) & 3] for i in range(length)]
+
+class SolutionCache:
+    '''LRU cache of shortest solutions, using at most about MAX_BYTES.
+    HITS, MISSES and EVICTIONS count what happened to get() and put().'''
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # (rows, cols, canonical state) -> (length, packed actions)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._reflections = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _reflection(self, shape):
+        '''Returns (cells, names): the tile at cell POS moves to cells[POS]
+        and is renamed names[tile]. None if SHAPE is not square.'''
+        if shape.rows != shape.cols or not shape.standard:
+            return None
+        if shape not in self._reflections:
+            cells = [(pos % shape.cols) * shape.cols + pos // shape.cols for pos in range(shape.size)]
+            names = [0] * shape.size
+            for pos, tile in enumerate(shape.goal_tiles):
+                names[tile] = shape.goal_tiles[cells[pos]]
+            self._reflections[shape] = (cells, names)
+        return self._reflections[shape]
+
+    def _key(self, shape, state):
+        '''Returns (key, reflected): the cache key of STATE and whether it
+        is the reflection of STATE that is stored under it.'''
+        reflection = self._reflection(shape)
+        if reflection is None:
+            return (shape.rows, shape.cols, state), False
+        cells, names = reflection
+        tiles = shape.unpack_tiles(state)
+        reflected = [0] * shape.size
+        for pos, tile in enumerate(tiles):
+            reflected[cells[pos]] = names[tile]
+        other = shape.pack_tiles(reflected)[0]
+        if other < state:
+            return (shape.rows, shape.cols, other), True
+        return (shape.rows, shape.cols, state), False
+
+    def get(self, shape, state):
+        '''Returns the cached solution of STATE, or None.'''
+        key, reflected = self._key(shape, state)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        actions = decode(entry[1], entry[0])
+        if reflected:
+            actions = [TRANSPOSED[action] for action in actions]
+        return actions
+
+    def put(self, shape, state, zero, actions):
+        '''Stores ACTIONS, a shortest solution of STATE, and the rest of it
+        for every board visited on the way. The boards are stored from the
+        goal back to STATE, so STATE is the last to be evicted.'''
+        states = [state]
+        for action in actions:
+            state, zero = shape.take(action, state, zero)
+            states.append(state)
+        for i in reversed(range(len(states))):
+            key, reflected = self._key(shape, states[i])
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            else:
+                rest = actions[i:]
+                if reflected:
+                    rest = [TRANSPOSED[action] for action in rest]
+                data = encode(rest)
+                self.entries[key] = (len(rest), data)
+                self.bytes += ENTRY_OVERHEAD + len(data)
+        while self.bytes > self.max_bytes and self.entries:
+            key, (length, data) = self.entries.popitem(last=False)
+            self.bytes -= ENTRY_OVERHEAD + len(data)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def counters(self):
+        '''Returns the hit, miss and eviction counters and the size as a dict.'''
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
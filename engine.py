@@ -0,0 +1,143 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# A compact board engine used by puzzle.py.
+#
+# A board state is stored as a single packed integer: cell number i (counted
+# row by row from the top-left corner) occupies BITS bits starting at bit
+# i * BITS. The position of the empty slot (0) is kept next to the state as a
+# plain cell number, so it never has to be searched for.
+#
+# Everything that only depends on the size of the board (bit shifts, which
+# cells neighbour which, the goal state) is computed once per size and cached
+# in a Shape object, see get_shape(). Shapes can also be made for a custom
+# goal layout, but the precomputed data of other modules (pattern databases,
+# oracle tables) only exists for the standard goal.
+
+ACTIONS = ["up", "down", "left", "right"] # Same vocabulary as puzzle.py
+OPPOSITE = {"up": "down", "down": "up", "left": "right", "right": "left"}
+
+class Shape:
+    '''Precomputed tables for boards with ROWS rows and COLS columns.
+
+    moves[pos] is a tuple of (action, new_pos) pairs listing where the empty
+    slot can go from cell POS, in the order of ACTIONS. step[pos] maps the
+    same actions to their new_pos.
+
+    GOAL_TILES is the flat goal layout; by default tiles in increasing order
+    with the empty slot in the bottom-right corner (then STANDARD is True).
+    '''
+    def __init__(self, rows, cols, goal_tiles=None):
+        assert rows >= 2 and cols >= 2, "Boards must be at least 2x2."
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.bits = max(1, (self.size - 1).bit_length())
+        self.mask = (1 << self.bits) - 1
+        self.shifts = tuple(pos * self.bits for pos in range(self.size))
+        self.units = tuple(1 << shift for shift in self.shifts)
+        self.moves = tuple(self._moves_from(pos) for pos in range(self.size))
+        self.step = tuple(dict(moves) for moves in self.moves)
+        self.legal = tuple([action for action, _ in moves] for moves in self.moves)
+        standard_tiles = tuple(range(1, self.size)) + (0,)
+        self.goal_tiles = tuple(goal_tiles) if goal_tiles is not None else standard_tiles
+        assert sorted(self.goal_tiles) == list(range(self.size)), "Invalid goal: {}".format(goal_tiles)
+        self.standard = self.goal_tiles == standard_tiles
+        self.goal, self.goal_zero = self.pack_tiles(self.goal_tiles)
+
+    def _moves_from(self, pos):
+        row, col = divmod(pos, self.cols)
+        moves = []
+        if row > 0:
+            moves.append(("up", pos - self.cols))
+        if row < self.rows - 1:
+            moves.append(("down", pos + self.cols))
+        if col > 0:
+            moves.append(("left", pos - 1))
+        if col < self.cols - 1:
+            moves.append(("right", pos + 1))
+        return tuple(moves)
+
+    def solvable(self, tiles, goal_tiles=None):
+        '''Returns True iff the flat sequence TILES can be turned into
+        GOAL_TILES (by default the goal of this shape).
+
+        Every move swaps the empty slot with a neighbour: it changes the
+        parity of the permutation between TILES and the goal, and also the
+        parity of the distance between the empty slot and its goal cell.
+        The goal can only be reached if both parities agree, and it is a
+        classic result that it can always be reached when they do.'''
+        if goal_tiles is None:
+            goal_tiles = self.goal_tiles
+        else:
+            assert sorted(goal_tiles) == list(range(self.size)), "Invalid goal: {}".format(list(goal_tiles))
+        assert sorted(tiles) == list(range(self.size)), "Invalid board: {}".format(tiles)
+        goal_pos = [0] * self.size
+        for pos, tile in enumerate(goal_tiles):
+            goal_pos[tile] = pos
+        swaps = 0
+        seen = [False] * self.size
+        for start in range(self.size):
+            if not seen[start]:
+                pos, length = start, 0
+                while not seen[pos]:
+                    seen[pos] = True
+                    pos = goal_pos[tiles[pos]]
+                    length += 1
+                swaps += length - 1 # A cycle of length L takes L - 1 swaps.
+        zero_row, zero_col = divmod(list(tiles).index(0), self.cols)
+        goal_row, goal_col = divmod(goal_pos[0], self.cols)
+        return swaps % 2 == (abs(zero_row - goal_row) + abs(zero_col - goal_col)) % 2
+
+    def pack_tiles(self, tiles):
+        '''Returns (state, zero) for the flat sequence TILES.'''
+        state = 0
+        for tile, shift in zip(tiles, self.shifts):
+            state |= tile << shift
+        return state, list(tiles).index(0)
+
+    def unpack_tiles(self, state):
+        '''Returns the flat list of tiles stored in STATE.'''
+        mask = self.mask
+        return [(state >> shift) & mask for shift in self.shifts]
+
+    def pack(self, board):
+        '''Returns (state, zero) for the 2D list BOARD.'''
+        return self.pack_tiles([tile for row in board for tile in row])
+
+    def unpack(self, state):
+        '''Returns STATE as a 2D list.'''
+        tiles = self.unpack_tiles(state)
+        return [tiles[row * self.cols:(row + 1) * self.cols] for row in range(self.rows)]
+
+    def tile(self, state, pos):
+        '''Returns the tile at cell POS of STATE.'''
+        return (state >> self.shifts[pos]) & self.mask
+
+    def move(self, state, zero, new_zero):
+        '''Returns the state obtained by sliding the empty slot of STATE
+        from cell ZERO to the neighbouring cell NEW_ZERO.'''
+        tile = (state >> self.shifts[new_zero]) & self.mask
+        return state + tile * (self.units[zero] - self.units[new_zero])
+
+    def take(self, action, state, zero):
+        '''Returns (new_state, new_zero) after taking ACTION, assuming it is legal.'''
+        assert action in self.step[zero], "Illegal action: '{}'".format(action)
+        new_zero = self.step[zero][action]
+        return self.move(state, zero, new_zero), new_zero
+
+_shapes = {}
+
+def get_shape(rows, cols):
+    '''Returns the (cached) Shape for boards with ROWS rows and COLS columns.'''
+    key = (rows, cols)
+    if key not in _shapes:
+        _shapes[key] = Shape(rows, cols)
+    return _shapes[key]
+
+def shape_of(board):
+    '''Returns the Shape matching the dimensions of the 2D list BOARD.'''
+    return get_shape(len(board), len(board[0]))
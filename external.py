@@ -0,0 +1,250 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Breadth-first enumeration of a whole state space, kept on disk.
+#
+# Starting from the goal, every depth ("layer") of the search is written to
+# its own file of sorted, fixed-width big-endian records. A record is the
+# packed state of engine.py shifted left, with the position of the empty
+# slot in the low bits, so expanding a record needs no scanning.
+#
+# Layer d+1 is made by streaming layer d, generating all neighbours into
+# sorted runs of at most CHUNK records, then merging the runs while dropping
+# duplicates and anything found in layers d and d-1. On this graph every
+# neighbour of layer d is at depth d-1, d or d+1, so those two layers are
+# the only ones that need checking and older layers never have to be read.
+#
+# Runs are merged FAN_IN at a time, in several passes if there are more of
+# them, so the number of open files stays bounded too.
+#
+# Memory use is bounded by CHUNK, not by the size of the state space. After
+# every layer a manifest is written, so a crashed run resumes from the last
+# complete layer:
+#
+#     python external.py 3 4 --workdir /data/bfs-3x4 --table /data/3x4.dist
+#
+# The output is a histogram of distances to the goal, and optionally a
+# single sorted table of (record, distance) pairs that lookup() can binary
+# search through mmap.
+
+import argparse # Used by the command line tool
+import heapq
+import json
+import mmap
+import os
+from engine import get_shape
+
+MANIFEST = "manifest.json"
+FAN_IN = 64 # Most run files merged (and open) at once
+
+class Layout:
+    '''Record format for SHAPE: WIDTH bytes per record, the empty slot
+    position in the low ZERO_BITS bits.'''
+    def __init__(self, shape):
+        self.shape = shape
+        self.zero_bits = (shape.size - 1).bit_length()
+        self.zero_mask = (1 << self.zero_bits) - 1
+        self.width = (shape.size * shape.bits + self.zero_bits + 7) // 8
+
+    def key(self, state, zero):
+        return state << self.zero_bits | zero
+
+    def split(self, key):
+        '''Returns (state, zero) of the record KEY.'''
+        return key >> self.zero_bits, key & self.zero_mask
+
+def read(path, width, block=1 << 16):
+    '''Yields the records of the file PATH in order, reading BLOCK of them
+    at a time.'''
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(width * block)
+            if not data:
+                return
+            for i in range(0, len(data), width):
+                yield int.from_bytes(data[i:i + width], "big")
+
+def write(path, keys, width):
+    '''Writes the sorted records KEYS to PATH and returns how many there were.'''
+    count = 0
+    with open(path + ".tmp", "wb") as f:
+        buffer = []
+        for key in keys:
+            buffer.append(key.to_bytes(width, "big"))
+            if len(buffer) == 1 << 16:
+                f.write(b"".join(buffer))
+                count += len(buffer)
+                buffer = []
+        f.write(b"".join(buffer))
+        count += len(buffer)
+    os.replace(path + ".tmp", path)
+    return count
+
+def unique(keys):
+    '''Yields the sorted KEYS without repetitions.'''
+    previous = None
+    for key in keys:
+        if key != previous:
+            yield key
+            previous = key
+
+def subtract(keys, exclude):
+    '''Yields the sorted KEYS that are not in the sorted EXCLUDE.'''
+    exclude = iter(exclude)
+    other = next(exclude, None)
+    for key in keys:
+        while other is not None and other < key:
+            other = next(exclude, None)
+        if key != other:
+            yield key
+
+def merge_runs(workdir, runs, width, fan_in=FAN_IN):
+    '''Merges the sorted run files RUNS, FAN_IN at a time and without
+    repetitions, into new runs in WORKDIR until at most FAN_IN are left.
+    Returns the remaining runs; the merged ones are removed.'''
+    level = 0
+    while len(runs) > fan_in:
+        level += 1
+        merged = []
+        for i in range(0, len(runs), fan_in):
+            path = os.path.join(workdir, "run-{}-{:05d}.bin".format(level, len(merged)))
+            write(path, unique(heapq.merge(*[read(run, width) for run in runs[i:i + fan_in]])), width)
+            merged.append(path)
+        for path in runs:
+            os.remove(path)
+        runs = merged
+    return runs
+
+def _layer(workdir, depth):
+    return os.path.join(workdir, "layer-{:03d}.bin".format(depth))
+
+def enumerate_layers(rows, cols, workdir, chunk=1 << 20, max_depth=None, progress=None, fan_in=FAN_IN):
+    '''Runs (or resumes) the layered search for ROWS x COLS boards in WORKDIR
+    and returns the histogram as a list: histogram[d] is the number of
+    states at distance d from the goal. PROGRESS is called with (depth,
+    count) after every layer. At most FAN_IN runs are merged at once.'''
+    shape = get_shape(rows, cols)
+    layout = Layout(shape)
+    width = layout.width
+    os.makedirs(workdir, exist_ok=True)
+    manifest_path = os.path.join(workdir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        assert (manifest["rows"], manifest["cols"]) == (rows, cols), "WORKDIR holds a search of another size."
+    else:
+        write(_layer(workdir, 0), [layout.key(shape.goal, shape.goal_zero)], width)
+        manifest = {"rows": rows, "cols": cols, "width": width, "histogram": [1]}
+        _save(manifest_path, manifest)
+    for name in os.listdir(workdir): # Leftovers of an interrupted layer
+        if name.startswith("run-") or name.endswith(".tmp"):
+            os.remove(os.path.join(workdir, name))
+    histogram = manifest["histogram"]
+    while histogram[-1] and (max_depth is None or len(histogram) <= max_depth):
+        depth = len(histogram) - 1
+        runs, buffer = [], []
+
+        def flush():
+            path = os.path.join(workdir, "run-{:05d}.bin".format(len(runs)))
+            buffer.sort()
+            write(path, unique(buffer), width)
+            runs.append(path)
+            buffer.clear()
+
+        for key in read(_layer(workdir, depth), width):
+            state, zero = layout.split(key)
+            for action, new_zero in shape.moves[zero]:
+                buffer.append(layout.key(shape.move(state, zero, new_zero), new_zero))
+            if len(buffer) >= chunk:
+                flush()
+        if buffer or not runs:
+            flush()
+        runs = merge_runs(workdir, runs, width, fan_in)
+        merged = unique(heapq.merge(*[read(path, width) for path in runs]))
+        merged = subtract(merged, read(_layer(workdir, depth), width))
+        if depth > 0:
+            merged = subtract(merged, read(_layer(workdir, depth - 1), width))
+        count = write(_layer(workdir, depth + 1), merged, width)
+        for path in runs:
+            os.remove(path)
+        histogram.append(count)
+        _save(manifest_path, manifest)
+        if progress:
+            progress(depth + 1, count)
+    if not histogram[-1]:
+        histogram = histogram[:-1]
+    return histogram
+
+def write_table(workdir, path):
+    '''Merges all layers of WORKDIR into the table file PATH: sorted records,
+    each followed by one byte holding its distance to the goal.'''
+    with open(os.path.join(workdir, MANIFEST)) as f:
+        manifest = json.load(f)
+    width = manifest["width"]
+    depths = [depth for depth, count in enumerate(manifest["histogram"]) if count]
+    streams = [_tagged(read(_layer(workdir, depth), width), depth) for depth in depths]
+    with open(path + ".tmp", "wb") as f:
+        buffer = []
+        for key, depth in heapq.merge(*streams):
+            buffer.append(key.to_bytes(width, "big") + bytes([depth]))
+            if len(buffer) == 1 << 16:
+                f.write(b"".join(buffer))
+                buffer = []
+        f.write(b"".join(buffer))
+    os.replace(path + ".tmp", path)
+
+def lookup(path, rows, cols, tiles):
+    '''Returns the distance to the goal of the flat board TILES from the
+    table file PATH, or None if it is not in the table.'''
+    shape = get_shape(rows, cols)
+    layout = Layout(shape)
+    record = layout.width + 1
+    target = layout.key(*shape.pack_tiles(tiles)).to_bytes(layout.width, "big")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as table:
+        lo, hi = 0, len(table) // record
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = table[mid * record:mid * record + layout.width]
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                return table[mid * record + layout.width]
+    return None
+
+def _tagged(keys, depth):
+    for key in keys:
+        yield key, depth
+
+def _save(path, manifest):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Disk-backed breadth-first enumeration from the goal.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--workdir", required=True, help="directory for the layer files (resumed if present)")
+    parser.add_argument("--chunk", type=int, default=1 << 20, help="records sorted in memory at a time")
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--fan-in", type=int, default=FAN_IN, help="sorted runs merged at a time")
+    parser.add_argument("--table", help="also write the full distance table to this file")
+    args = parser.parse_args(argv)
+
+    def progress(depth, count):
+        print("depth {:3d}: {} states".format(depth, count), flush=True)
+
+    histogram = enumerate_layers(args.rows, args.cols, args.workdir, args.chunk, args.max_depth, progress, args.fan_in)
+    print("Total:", sum(histogram), "states, deepest:", len(histogram) - 1)
+    print(json.dumps({str(depth): count for depth, count in enumerate(histogram)}))
+    if args.table:
+        write_table(args.workdir, args.table)
+        print("Wrote", args.table)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Load generator for service.py: sends REQUESTS solve requests from
+# CONCURRENCY tasks at once and reports throughput and latency.
+#
+#     python service.py --unix /tmp/puzzle.sock &
+#     python loadgen.py --unix /tmp/puzzle.sock --requests 5000 --concurrency 64
+
+import argparse # Used by the command line tool
+import asyncio
+import json
+import random
+import time
+from engine import get_shape
+from service import Client
+from stats import percentile
+
+def make_boards(rows, cols, count, moves, seed):
+    '''Returns COUNT boards, each MOVES random actions away from the goal.'''
+    rng = random.Random(seed)
+    shape = get_shape(rows, cols)
+    boards = []
+    for i in range(count):
+        state, zero = shape.goal, shape.goal_zero
+        for step in range(moves):
+            action, new_zero = rng.choice(shape.moves[zero])
+            state, zero = shape.move(state, zero, new_zero), new_zero
+        boards.append(shape.unpack(state))
+    return boards
+
+async def run(args):
+    boards = make_boards(args.rows, args.cols, args.distinct, args.moves, args.seed)
+    client = await Client.connect(args.host, args.port, args.unix)
+    rng = random.Random(args.seed)
+    latencies, failures = [], 0
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            solution = await client.solve(rng.choice(boards), args.method, args.timeout)
+            latencies.append(time.perf_counter() - start)
+            if not isinstance(solution, list):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for i in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    metrics = await client.metrics()
+    await client.close()
+    print("{} requests in {:.2f}s: {:.0f} requests/s, {} not solved".format(
+        len(latencies), elapsed, len(latencies) / elapsed, failures))
+    for p in (50, 95, 99, 100):
+        print("p{:<3} {:9.3f} ms".format(p, 1000 * percentile(latencies, p)))
+    print("server:", json.dumps(metrics))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of service.py.")
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=500, help="number of different boards to send")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--moves", type=int, default=50, help="random moves used to shuffle each board")
+    parser.add_argument("--method", default=None)
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
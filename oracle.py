@@ -0,0 +1,155 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Complete distance tables for small boards (the 3x3 puzzle in particular).
+#
+# A breadth-first search backwards from the goal visits every solvable state
+# once and stores, for each of them, one byte:
+#     bits 0-5: the number of moves in a shortest solution
+#     bits 6-7: the index in ACTIONS of the first move of such a solution
+# States are numbered by the rank of their permutation (Lehmer code), so the
+# table is a flat array of n! bytes; 255 marks states that cannot be solved.
+#
+# Tables are built once, like pattern databases, and then opened through
+# mmap. Solving takes one lookup per move:
+#
+#     python oracle.py 3 3
+#
+# solve() uses the table in PDB_DIR when it exists; without one, 3x3 boards
+# are searched with A*, unless "oracle" is asked for by name, in which case
+# the table is built in memory for the process (about 4 seconds for 3x3).
+
+import argparse # Used by the command line tool
+import mmap # Used to share the table between processes
+import os
+import tempfile
+import time
+from engine import ACTIONS, OPPOSITE, get_shape
+from patterns import PDB_DIR
+
+UNSOLVABLE = 255
+MAX_SIZE = 10 # 10! bytes is 3.6MB; the next size up would be 479MB.
+
+def rank(tiles):
+    '''Returns the rank of the permutation TILES among all permutations
+    of its elements in lexicographic order.'''
+    index = 0
+    n = len(tiles)
+    for i in range(n):
+        smaller = 0
+        for j in range(i + 1, n):
+            if tiles[j] < tiles[i]:
+                smaller += 1
+        index = index * (n - i) + smaller
+    return index
+
+def build(shape):
+    '''Returns the distance table of SHAPE as a bytearray.'''
+    assert shape.standard, "Oracle tables only exist for the standard goal."
+    assert shape.size <= MAX_SIZE, "Boards with more than {} cells are too large for a table.".format(MAX_SIZE)
+    total = 1
+    for i in range(2, shape.size + 1):
+        total *= i
+    table = bytearray([UNSOLVABLE]) * total
+    table[rank(shape.goal_tiles)] = 0
+    frontier = [(shape.goal, shape.goal_zero)]
+    depth = 0
+    while frontier:
+        depth += 1
+        deeper = []
+        for state, zero in frontier:
+            for action, new_zero in shape.moves[zero]:
+                new_state = shape.move(state, zero, new_zero)
+                index = rank(shape.unpack_tiles(new_state))
+                if table[index] == UNSOLVABLE:
+                    # Going back to STATE undoes ACTION.
+                    table[index] = ACTIONS.index(OPPOSITE[action]) << 6 | depth
+                    deeper.append((new_state, new_zero))
+        frontier = deeper
+    return table
+
+_tables = {}
+
+def table_path(rows, cols):
+    return os.path.join(PDB_DIR, "{}x{}.oracle".format(rows, cols))
+
+def available(shape):
+    '''Returns True iff the table of SHAPE is loaded or saved in PDB_DIR.'''
+    return shape.standard and (shape in _tables or os.path.exists(table_path(shape.rows, shape.cols)))
+
+def save(shape, path=None):
+    '''Builds the table of SHAPE and writes it to PATH (by default in
+    PDB_DIR). The file is written under a unique temporary name and then
+    renamed, so processes reading the table never see a partial one.'''
+    path = path or table_path(shape.rows, shape.cols)
+    table = build(shape)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(table)
+        os.chmod(tmp, 0o644) # mkstemp() makes the file private
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return path
+
+def get_table(shape):
+    '''Returns the (cached) table of SHAPE: the file in PDB_DIR if it
+    exists, else a table built in memory.'''
+    assert shape.standard, "Oracle tables only exist for the standard goal."
+    if shape not in _tables:
+        path = table_path(shape.rows, shape.cols)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                _tables[shape] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            _tables[shape] = build(shape)
+    return _tables[shape]
+
+def distance(shape, state):
+    '''Returns the length of a shortest solution of STATE, or None if it
+    cannot be solved.'''
+    entry = get_table(shape)[rank(shape.unpack_tiles(state))]
+    return None if entry == UNSOLVABLE else entry & 63
+
+def solve(shape, state, zero, heuristic=None, stats=None):
+    '''Returns a shortest list of actions solving STATE by following the
+    table, or None if it cannot be solved. HEURISTIC is ignored; each
+    lookup counts as one expanded state in STATS.'''
+    table = get_table(shape)
+    tiles = shape.unpack_tiles(state)
+    actions = []
+    entry = table[rank(tiles)]
+    if entry == UNSOLVABLE:
+        return None
+    if stats is not None:
+        stats.initial_h = entry & 63 # The table is a perfect heuristic.
+    while entry & 63:
+        if stats is not None:
+            stats.expand(len(actions), 1)
+        action = ACTIONS[entry >> 6]
+        new_zero = shape.step[zero][action]
+        tiles[zero], tiles[new_zero] = tiles[new_zero], 0
+        zero = new_zero
+        actions.append(action)
+        entry = table[rank(tiles)]
+    return actions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the complete distance table of a small board.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("-o", "--output", help="output file (default: PDB_DIR/<rows>x<cols>.oracle)")
+    args = parser.parse_args(argv)
+    start = time.time()
+    path = save(get_shape(args.rows, args.cols), args.output)
+    print("Wrote", path, "in {:.1f}s".format(time.time() - start))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Disjoint additive pattern databases.
+#
+# The tiles of a board are split into disjoint groups ("patterns"). For each
+# pattern, a breadth-first search from the goal records how many moves OF
+# THE PATTERN TILES are needed to bring them home, whatever the other tiles
+# do. Since no move is counted by two patterns, the values of all patterns
+# can be added up and still never overestimate the real solution length.
+#
+# An entry is indexed by the positions of the pattern tiles (see rank()).
+# The real value is always the Manhattan distance of the pattern tiles plus
+# an even number of extra moves, so only half of that extra is stored, in
+# 4 bits (capped at 15). Two entries share a byte.
+#
+# Building a database can take hours for the larger patterns, so it is done
+# once from the command line and written to a file:
+#
+#     python patterns.py 4 4 --split 6-6-3 -o pdb/4x4.pdb
+#
+# The file is opened through mmap, so processes solving in parallel share a
+# single copy of the tables in memory. search.get_heuristic() picks up
+# databases placed in PDB_DIR automatically.
+
+import argparse # Used by the command line builder
+import mmap # Used to share the tables between processes
+import os
+import pickle # Used for the resumable build checkpoints
+import struct # Used for the file header
+import sys
+import time
+from engine import get_shape
+
+MAGIC = b"SPDB"
+VERSION = 1
+PDB_DIR = os.environ.get("SLIDING_PUZZLE_PDB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb"))
+DEFAULT_SPLITS = {
+    (3, 3): "4-4",
+    (3, 4): "6-5",
+    (4, 4): "6-6-3",
+    (4, 5): "6-6-7",
+    (5, 5): "6-6-6-6",
+}
+
+def split_tiles(shape, split):
+    '''Returns the patterns described by SPLIT, e.g. "6-6-3": the first 6
+    tiles, the next 6 tiles and the last 3 tiles, in goal order.'''
+    sizes = [int(size) for size in split.split("-")]
+    assert sum(sizes) == shape.size - 1, "Split '{}' does not cover the {} tiles.".format(split, shape.size - 1)
+    patterns, first = [], 1
+    for size in sizes:
+        patterns.append(tuple(range(first, first + size)))
+        first += size
+    return patterns
+
+def entries(cells, k):
+    '''Returns the number of ways to place K distinct tiles in CELLS cells.'''
+    count = 1
+    for i in range(k):
+        count *= cells - i
+    return count
+
+def rank(positions, cells):
+    '''Returns the index of the placement POSITIONS among all placements of
+    len(POSITIONS) distinct tiles in CELLS cells (a partial Lehmer code).'''
+    index = 0
+    for i, pos in enumerate(positions):
+        smaller = 0
+        for j in range(i):
+            if positions[j] < pos:
+                smaller += 1
+        index = index * (cells - i) + pos - smaller
+    return index
+
+def unrank(index, k, cells):
+    '''Inverse of rank().'''
+    digits = []
+    for i in range(k - 1, -1, -1):
+        index, digit = divmod(index, cells - i)
+        digits.append(digit)
+    digits.reverse()
+    free = list(range(cells))
+    return [free.pop(digit) for digit in digits]
+
+class PatternDatabase:
+    '''Additive pattern database heuristic loaded from a file built by
+    this module. Offers the same estimate()/update() interface as
+    search.ManhattanConflict.'''
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, cols, count = struct.unpack_from("<4sBBBB", self.data, 0)
+        assert magic == MAGIC and version == VERSION, "'{}' is not a pattern database.".format(path)
+        self.shape = shape = get_shape(rows, cols)
+        self.patterns = []
+        self.offsets = []
+        header = struct.calcsize("<4sBBBB")
+        offset = header + count
+        for i in range(count):
+            k = self.data[header + i]
+            self.patterns.append(tuple(self.data[offset:offset + k]))
+            offset += k
+        offset = header + count + shape.size - 1 # Tile lists are padded to one byte per tile.
+        for pattern in self.patterns:
+            self.offsets.append(offset)
+            offset += (entries(shape.size, len(pattern)) + 1) // 2
+        self.pattern_of = [None] * shape.size # tile -> index of its pattern
+        for i, pattern in enumerate(self.patterns):
+            for tile in pattern:
+                self.pattern_of[tile] = i
+        self.distance = _distances(shape)
+
+    def value(self, i, positions):
+        '''Returns the value of pattern number I with its tiles at POSITIONS.'''
+        index = rank(positions, self.shape.size)
+        byte = self.data[self.offsets[i] + (index >> 1)]
+        extra = (byte >> 4 * (index & 1)) & 15
+        distance = 0
+        for tile, pos in zip(self.patterns[i], positions):
+            distance += self.distance[tile][pos]
+        return distance + 2 * extra
+
+    def estimate(self, state):
+        '''Returns the heuristic value of STATE.'''
+        where = _positions(self.shape, state)
+        return sum(self.value(i, [where[tile] for tile in pattern]) for i, pattern in enumerate(self.patterns))
+
+    def update(self, h, state, new_state, zero, new_zero):
+        '''Returns the heuristic value of NEW_STATE, obtained from STATE
+        (whose value is H) by moving the empty slot from ZERO to NEW_ZERO.
+        Only the pattern of the moved tile changes.'''
+        i = self.pattern_of[self.shape.tile(state, new_zero)]
+        if i is None:
+            return h # The moved tile is not part of any pattern.
+        where = _positions(self.shape, state)
+        old = [where[tile] for tile in self.patterns[i]]
+        new = [zero if pos == new_zero else pos for pos in old]
+        return h - self.value(i, old) + self.value(i, new)
+
+def load(path=None, rows=None, cols=None):
+    '''Returns the PatternDatabase stored at PATH, or the one for ROWS x COLS
+    boards in PDB_DIR. Returns None if there is no such file.'''
+    path = path or os.path.join(PDB_DIR, "{}x{}.pdb".format(rows, cols))
+    if not os.path.exists(path):
+        return None
+    return PatternDatabase(path)
+
+def _positions(shape, state):
+    '''Returns a list mapping each tile of STATE to its position.'''
+    where = [0] * shape.size
+    for pos, tile in enumerate(shape.unpack_tiles(state)):
+        where[tile] = pos
+    return where
+
+def _distances(shape):
+    '''Returns distance[tile][pos], the Manhattan distance of TILE at POS.'''
+    distance = [[0] * shape.size for tile in range(shape.size)]
+    for goal_pos, tile in enumerate(shape.goal_tiles):
+        for pos in range(shape.size):
+            distance[tile][pos] = abs(pos // shape.cols - goal_pos // shape.cols) + abs(pos % shape.cols - goal_pos % shape.cols)
+    return distance
+
+def build_pattern(shape, pattern, checkpoint=None, progress=None):
+    '''Returns the nibble-packed table for PATTERN as a bytearray.
+
+    The search runs over (pattern positions, blank position) pairs. Moving
+    the blank onto a cell that holds no pattern tile costs nothing, so each
+    depth is first closed under such moves before going one move deeper.
+    If CHECKPOINT is a file name, the search state is saved there after
+    every depth and picked up again if the build is restarted.
+    PROGRESS is called with (depth, entries_done, entries_total).'''
+    cells, k = shape.size, len(pattern)
+    total = entries(cells, k)
+    distance = _distances(shape)
+    state = None
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint, "rb") as f:
+            state = pickle.load(f)
+        if state["pattern"] != pattern:
+            state = None
+    if state is None:
+        goal = shape.goal_tiles
+        start = rank([goal.index(tile) for tile in pattern], cells) * cells + shape.goal_zero
+        state = {
+            "pattern": pattern,
+            "depth": 0,
+            "done": 0,
+            "extra": bytearray(b"\xff") * total, # half the extra moves over Manhattan, 255 = unknown
+            "seen": bytearray((total * cells + 7) // 8), # bitset over (rank, blank) pairs
+            "frontier": [start],
+        }
+    extra, seen, frontier = state["extra"], state["seen"], state["frontier"]
+    depth, done = state["depth"], state["done"]
+    neighbours = [[new_pos for action, new_pos in shape.moves[pos]] for pos in range(cells)]
+    while frontier:
+        stack, deeper = [], []
+        for key in frontier:
+            if not seen[key >> 3] & (1 << (key & 7)):
+                seen[key >> 3] |= 1 << (key & 7)
+                stack.append(key)
+        while stack:
+            key = stack.pop()
+            index, blank = divmod(key, cells)
+            positions = unrank(index, k, cells)
+            if extra[index] == 255:
+                moves = sum(distance[tile][pos] for tile, pos in zip(pattern, positions))
+                extra[index] = min(15, (depth - moves) // 2)
+                done += 1
+            for pos in neighbours[blank]:
+                if pos in positions:
+                    moved = [blank if p == pos else p for p in positions]
+                    deeper.append(rank(moved, cells) * cells + pos)
+                else:
+                    new_key = index * cells + pos
+                    if not seen[new_key >> 3] & (1 << (new_key & 7)):
+                        seen[new_key >> 3] |= 1 << (new_key & 7)
+                        stack.append(new_key)
+        frontier, depth = deeper, depth + 1
+        if progress:
+            progress(depth - 1, done, total)
+        if checkpoint:
+            state.update(depth=depth, done=done, frontier=frontier)
+            _save(checkpoint, state)
+    packed = bytearray((total + 1) // 2)
+    for index in range(total):
+        packed[index >> 1] |= min(extra[index], 15) << 4 * (index & 1)
+    return packed
+
+def build(rows, cols, patterns, path, progress=None):
+    '''Builds the database for PATTERNS on ROWS x COLS boards into PATH.
+    Finished patterns and the current one are checkpointed next to PATH,
+    so an interrupted build resumes where it stopped.'''
+    shape = get_shape(rows, cols)
+    finished_path, checkpoint = path + ".done", path + ".partial"
+    finished = {}
+    if os.path.exists(finished_path):
+        with open(finished_path, "rb") as f:
+            finished = pickle.load(f)
+    for i, pattern in enumerate(patterns):
+        if pattern in finished:
+            continue
+        report = (lambda depth, done, total, i=i: progress(i, depth, done, total)) if progress else None
+        finished[pattern] = bytes(build_pattern(shape, pattern, checkpoint, report))
+        _save(finished_path, finished)
+        os.remove(checkpoint)
+    with open(path + ".tmp", "wb") as f:
+        f.write(struct.pack("<4sBBBB", MAGIC, VERSION, rows, cols, len(patterns)))
+        f.write(bytes(len(pattern) for pattern in patterns))
+        padding = shape.size - 1 - sum(len(pattern) for pattern in patterns)
+        for pattern in patterns:
+            f.write(bytes(pattern))
+        f.write(bytes(padding))
+        for pattern in patterns:
+            f.write(finished[pattern])
+    os.replace(path + ".tmp", path)
+    os.remove(finished_path)
+
+def _save(path, obj):
+    '''Pickles OBJ to PATH without leaving a half-written file behind.'''
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an additive pattern database.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("cols", type=int)
+    parser.add_argument("--split", help='tile group sizes in goal order, e.g. "6-6-3"')
+    parser.add_argument("--pattern", action="append", help='explicit tile group, e.g. "1,2,5,6" (repeatable)')
+    parser.add_argument("-o", "--output", help="output file (default: PDB_DIR/<rows>x<cols>.pdb)")
+    args = parser.parse_args(argv)
+    shape = get_shape(args.rows, args.cols)
+    if args.pattern:
+        patterns = [tuple(int(tile) for tile in pattern.split(",")) for pattern in args.pattern]
+        tiles = sorted(tile for pattern in patterns for tile in pattern)
+        assert len(set(tiles)) == len(tiles), "Patterns must be disjoint."
+    else:
+        patterns = split_tiles(shape, args.split or DEFAULT_SPLITS[(args.rows, args.cols)])
+    output = args.output or os.path.join(PDB_DIR, "{}x{}.pdb".format(args.rows, args.cols))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    start = time.time()
+
+    def progress(i, depth, done, total):
+        print("pattern {}/{} {}: depth {}, {}/{} entries ({:.1f}%), {:.0f}s".format(
+            i + 1, len(patterns), patterns[i], depth, done, total, 100 * done / total, time.time() - start),
+            file=sys.stderr)
+
+    build(args.rows, args.cols, patterns, output, progress)
+    print("Wrote", output)
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,12 @@
 ## All rights reserved.        ##
 #################################
 
-from copy import deepcopy # Used to copy boards represented as 2D lists
 from random import choice # Used in shuffle() to choose randomly from legal actions
-from time import sleep # Used in visualization
 import os # useful for clear console screen utility
+from engine import shape_of # Packed-integer board engine with per-size move tables
+import search # A*, IDA* and BFS solvers working on packed boards
+from stats import BUDGET_EXCEEDED
+import render # Buffered, in-place terminal drawing used in visualization
 
 sample_board = [ #represented as a 2D list
     [1,2,3],
@@ -25,20 +27,15 @@ def print_board(board):
     -------------
     | 1 | 8 | 4 |
     -------------
+    Cells widen to fit boards with two-digit tiles.
     '''
-    print("-------------")
-    for row in range(len(board)):
-        print("| ", end="")
-        for col in range(len(board[0])):
-            content = board[row][col]
-            print(content if content != 0 else " ", end=" | ")
-        print("\n-------------")
-
-def play():
+    print(render.draw(board), end="")
+
+def play(fps=1):
     ''' Plays a sliding puzzle game by
     1. Shuffling the sample_board to get initial board state
     2. Solve the puzzle and obtain a list of actions
-    3. Visualize the solution
+    3. Visualize the solution at FPS frames per second
     '''
     board = shuffle(sample_board)
     print("This is the randomly shuffled initial state:")
@@ -50,24 +47,19 @@ def play():
         return
     print("Solved!")
     input("Press Enter to start visualization: ")
-    visualize(board, actions)
+    visualize(board, actions, fps)
 
-def visualize(board, actions):
+def visualize(board, actions, fps=None, out=None, diff=False):
     ''' Visualize the transitions in BOARD by printing each states after taking actions.
-    Transition time interval: 1 second. The screen is cleared by calling cls() before printing. '''
-    copy = deepcopy(board)
-    cls()
-    print_board(copy)
-    sleep(1)
-    for action in actions:
-        copy = take(action, copy)
-        cls()
-        print_board(copy)
-        sleep(1)
-    print("Solved! Total steps:", len(actions))
-    print("Initial state:")
-    print_board(board)
-    print("Actions took:", actions, "(Actions are defined as ways the empty slot is moved around.)")
+    FPS states are shown per second (as fast as possible if FPS is 0). On a terminal
+    each state is redrawn in place, one per second by default; otherwise, or when OUT
+    is a file, the states are written one after another without waiting unless FPS is
+    given, or with DIFF only one line per action. See render.replay(). '''
+    render.replay(board, actions, fps, out, diff=diff)
+    print("Solved! Total steps:", len(actions), file=out)
+    print("Initial state:", file=out)
+    print(render.draw(board), end="", file=out)
+    print("Actions took:", actions, "(Actions are defined as ways the empty slot is moved around.)", file=out)
 
 def find_zero(board):
     '''Returns the coordinate as (row_number, column_number)
@@ -83,10 +75,8 @@ def find_zero(board):
     | 1 | 8 | 4 |
     -------------
     '''
-    for row in range(len(board)):
-        for col in range(len(board[0])):
-            if board[row][col] == 0:
-                return row, col
+    shape = shape_of(board)
+    return divmod(shape.pack(board)[1], shape.cols)
 
 def get_legal_actions(board):
     '''Returns a list of legal actions in BOARD. Actions are represented
@@ -101,19 +91,8 @@ def get_legal_actions(board):
     -------------
     | 1 | 8 | 4 |
     -------------'''
-    zero_pos = find_zero(board)
-    board_rows = len(board)
-    board_cols = len(board[0])
-    actions = ACTIONS[:]
-    if zero_pos[0] == 0:
-        actions.remove("up")
-    if zero_pos[0] == board_rows - 1:
-        actions.remove("down")
-    if zero_pos[1] == 0:
-        actions.remove("left")
-    if zero_pos[1] == board_cols - 1:
-        actions.remove("right")
-    return actions
+    shape = shape_of(board)
+    return shape.legal[shape.pack(board)[1]][:]
 
 def take(action, board):
     '''Returns the resulting board after taking ACTION on BOARD,
@@ -138,28 +117,19 @@ def take(action, board):
     -------------
     '''
     assert action in ACTIONS, "Invalid action: '{}'".format(action)
-    zero_pos = find_zero(board)
-    zero_row = zero_pos[0]
-    zero_col = zero_pos[1]
-    new_board = deepcopy(board)
-    if action == "up":
-        new_board[zero_row][zero_col], new_board[zero_row - 1][zero_col] = new_board[zero_row - 1][zero_col], new_board[zero_row][zero_col]
-    if action == "down":
-        new_board[zero_row][zero_col], new_board[zero_row + 1][zero_col] = new_board[zero_row + 1][zero_col], new_board[zero_row][zero_col]
-    if action == "left":
-        new_board[zero_row][zero_col], new_board[zero_row][zero_col - 1] = new_board[zero_row][zero_col - 1], new_board[zero_row][zero_col]
-    if action == "right":
-        new_board[zero_row][zero_col], new_board[zero_row][zero_col + 1] = new_board[zero_row][zero_col + 1], new_board[zero_row][zero_col]
-    return new_board
+    shape = shape_of(board)
+    state, zero = shape.pack(board)
+    return shape.unpack(shape.take(action, state, zero)[0])
 
 def shuffle(board):
     '''Return a new board obtained by taking 50 random
     actions from BOARD. '''
-    new_board = deepcopy(board)
+    shape = shape_of(board)
+    state, zero = shape.pack(board)
     for i in range(50):
-        action = choice(get_legal_actions(new_board))
-        new_board = take(action, new_board)
-    return new_board
+        action, new_zero = choice(shape.moves[zero])
+        state, zero = shape.move(state, zero, new_zero), new_zero
+    return shape.unpack(state)
 
 def is_goal(board):
     '''Returns True iff BOARD is
@@ -169,10 +139,30 @@ def is_goal(board):
     | 4 | 5 | 6 |
     -------------
     | 7 | 8 |   |
-    -------------'''
-    return board == [[1,2,3],[4,5,6],[7,8,0]]
-
-def solve(board):
+    -------------
+    Boards of other sizes are compared against the same layout: tiles
+    in increasing order with the empty slot in the bottom-right corner.'''
+    shape = shape_of(board)
+    return shape.pack(board)[0] == shape.goal
+
+def is_solvable(board, goal=None):
+    '''Returns True iff BOARD can be turned into GOAL (by default the
+    layout described in is_goal()). Runs in time linear in the board size,
+    without searching.'''
+    shape = shape_of(board)
+    tiles = [tile for row in board for tile in row]
+    if goal is None:
+        return shape.solvable(tiles)
+    return shape.solvable(tiles, _goal_tiles(shape, goal))
+
+def _goal_tiles(shape, goal):
+    '''Returns the 2D list GOAL as a flat list, checking that it has the
+    dimensions of SHAPE. Its tiles are checked by shape.solvable().'''
+    assert len(goal) == shape.rows and all(len(row) == shape.cols for row in goal), \
+        "Goal must be a {}x{} board: {}".format(shape.rows, shape.cols, goal)
+    return [tile for row in goal for tile in row]
+
+def solve(board, method=None, goal=None, stats=None, cache=None, improved=None):
     '''Returns a list of actions which, taken on BOARD, solves the puzzle by
     turning the board into the following form:
     -------------
@@ -182,24 +172,54 @@ def solve(board):
     -------------
     | 7 | 8 |   |
     -------------
+    Boards of any size are solved towards the same layout (see is_goal()),
+    or towards GOAL if given, which must be a board of the same size.
     Returns "NO_SOLUTION" if there is no solution.
+
+    STATS, a stats.Stats, collects node counts and timings of the search
+    and may set node, time or memory budgets. When a budget runs out the
+    search stops and "BUDGET_EXCEEDED" is returned.
+
+    CACHE, a cache.SolutionCache, is checked before searching and filled
+    with every board along the solution found. It is not used with GOAL.
+    A cache hit is recorded in STATS as solved with no states expanded.
+
+    METHOD names a solver in search.SOLVERS ("oracle", "astar", "idastar",
+    "bidirectional" or "bfs"). By default 3x3 boards are looked up in the oracle
+    table once it has been built (python oracle.py 3 3), A* is used for other
+    boards smaller than 4x4 and IDA* otherwise. All of them return a shortest
+    solution.
+
+    "anytime" trades length for time on 5x5 boards and up: it returns the
+    best solution found once the time budget of STATS (10 seconds if STATS
+    sets none) is used up, and stats.lower_bound tells how short one could
+    be. IMPROVED(actions, lower_bound) is called with every better solution
+    as soon as it is found. Its solutions are not cached.
     '''
-    visited = set() # This stores boards converted to strings from 2D lists.
-    q = []
-    q.append([[board, None]]) # The elements on the fringe are (board_state, last_action)
-    while q:
-        path = q.pop(0)
-        last_board = path[-1][0]
-        if str(last_board) not in visited:
-            visited.add(str(last_board))
-            if is_goal(last_board):
-                # return path
-                return [state[1] for state in path][1:] # We only need to return a list of actions
-            for action in get_legal_actions(last_board):
-                new_state = [take(action, last_board), action]
-                new_path = path + [new_state]
-                q.append(new_path)
-    return "NO_SOLUTION"
+    # Checked before the cache, so hits and misses fail alike.
+    assert method is None or method in search.SOLVERS, "Unknown method: {}".format(method)
+    assert improved is None or method == "anytime", "Only the anytime method reports improved solutions."
+    shape = shape_of(board)
+    tiles = [tile for row in board for tile in row]
+    if goal is not None:
+        goal = _goal_tiles(shape, goal)
+        cache = None
+    if cache is not None:
+        state, zero = shape.pack_tiles(tiles)
+        actions = cache.get(shape, state)
+        if actions is not None:
+            if stats is not None:
+                stats.begin()
+                stats.finish("SOLVED", actions)
+            if improved is not None:
+                improved(actions, len(actions)) # Cached solutions are shortest.
+            return actions
+    actions = search.solve(shape, tiles, goal, method, stats, improved)
+    if actions is None:
+        return "NO_SOLUTION"
+    if cache is not None and actions != BUDGET_EXCEEDED and method != "anytime":
+        cache.put(shape, state, zero, actions)
+    return actions
 
 def cls():
     '''Clears the terminal screen.'''
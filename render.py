@@ -0,0 +1,100 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Drawing boards and replaying solutions in the terminal.
+#
+# Every frame is built as one string and written with a single write(). On
+# a terminal the board is redrawn in place by moving the cursor back to the
+# top left corner, so replaying never starts a process to clear the screen
+# and never flickers. Cells are as wide as the widest tile, so boards with
+# two-digit tiles stay aligned.
+#
+# Without a terminal (or with headless=True) the frames are written one
+# after another instead, or with diff=True only the first board followed by
+# one line per move, which is what you want in a log file:
+#
+#     with open("replay.txt", "w") as f:
+#         replay(board, actions, out=f, diff=True)
+
+import os
+import sys
+import time
+
+HOME = "\x1b[H" # Moves the cursor to the top left corner
+CLEAR = "\x1b[H\x1b[2J" # Clears the screen
+CLEAR_BELOW = "\x1b[J" # Clears everything below the cursor
+DELTAS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+def board_lines(board):
+    '''Returns BOARD drawn as a list of lines in the following format:
+    -------------
+    | 4 | 3 | 6 |
+    -------------
+    |   | 5 | 7 |
+    -------------
+    | 1 | 8 | 4 |
+    -------------
+    '''
+    width = max(len(str(tile)) for row in board for tile in row)
+    line = "-" * (len(board[0]) * (width + 3) + 1)
+    lines = [line]
+    for row in board:
+        cells = [str(tile).rjust(width) if tile != 0 else " " * width for tile in row]
+        lines.append("| " + " | ".join(cells) + " |")
+        lines.append(line)
+    return lines
+
+def draw(board):
+    '''Returns BOARD drawn as one string, ending with a newline.'''
+    return "\n".join(board_lines(board)) + "\n"
+
+def _enable_ansi():
+    '''Makes the Windows console understand ANSI escape codes.'''
+    if os.name == 'nt':
+        os.system('') # Turns on virtual terminal processing as a side effect
+
+def replay(board, actions, fps=None, out=None, headless=None, diff=False):
+    '''Shows BOARD and then the board after each of ACTIONS, FPS frames per
+    second (no waiting if FPS is 0). Frames go to OUT, by default
+    sys.stdout. HEADLESS writes frames one after another instead of
+    redrawing in place, and is the default when OUT is not a terminal.
+    DIFF (headless only) writes the first board and then one line per
+    action. Without FPS, frames are shown once a second when redrawn in
+    place and written without waiting when headless. BOARD is not
+    modified.'''
+    out = out or sys.stdout
+    if headless is None:
+        headless = not (hasattr(out, "isatty") and out.isatty())
+    board = [list(row) for row in board]
+    zero = next((r, c) for r, row in enumerate(board) for c, tile in enumerate(row) if tile == 0)
+    if fps is None:
+        fps = 0 if headless else 1.0
+    delay = 1.0 / fps if fps else 0
+    deadline = time.perf_counter()
+    if not headless:
+        _enable_ansi()
+        out.write(CLEAR)
+    for step in range(len(actions) + 1):
+        if step:
+            action = actions[step - 1]
+            dr, dc = DELTAS[action]
+            (r, c), (nr, nc) = zero, (zero[0] + dr, zero[1] + dc)
+            tile = board[nr][nc]
+            board[r][c], board[nr][nc] = tile, 0
+            zero = (nr, nc)
+        if headless and diff and step:
+            out.write("{}: {} (tile {} from {} to {})\n".format(step, action, tile, (nr, nc), (r, c)))
+        elif headless:
+            out.write("Step {}/{}\n{}\n".format(step, len(actions), draw(board)))
+        else:
+            out.write(HOME + draw(board) + "Step {}/{}".format(step, len(actions)) + CLEAR_BELOW + "\n")
+        out.flush()
+        if delay and step < len(actions):
+            deadline += delay
+            pause = deadline - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+    return board
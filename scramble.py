@@ -0,0 +1,114 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Generating large numbers of shuffled boards with NumPy.
+#
+# Boards are rows of a uint8 array of shape (N, rows * cols), listing the
+# tiles row by row like engine.Shape.unpack_tiles(). Two modes are offered:
+#     "walk":    random legal moves from the goal, exactly like shuffle()
+#     "uniform": uniformly random among all solvable boards
+#
+#     python scramble.py 1000000 --rows 4 --cols 4 --mode uniform -o boards.npy
+#
+# Saved files can be opened memory-mapped with load(), and as_boards() turns
+# rows back into 2D lists for puzzle.solve() or batch.solve_many().
+
+import argparse # Used by the command line tool
+import numpy as np
+from engine import get_shape
+
+def walk(n, rows=3, cols=3, moves=50, seed=None):
+    '''Returns N boards, each obtained by taking MOVES random legal actions
+    from the goal. All boards take their steps at the same time.'''
+    shape = get_shape(rows, cols)
+    rng = np.random.default_rng(seed)
+    # neighbours[pos, i] is the cell reached by the i-th legal move from POS.
+    neighbours = np.zeros((shape.size, 4), dtype=np.intp)
+    counts = np.zeros(shape.size, dtype=np.intp)
+    for pos in range(shape.size):
+        counts[pos] = len(shape.moves[pos])
+        for i, (action, new_pos) in enumerate(shape.moves[pos]):
+            neighbours[pos, i] = new_pos
+    boards = np.tile(np.array(shape.goal_tiles, dtype=np.uint8), (n, 1))
+    zero = np.full(n, shape.goal_zero, dtype=np.intp)
+    index = np.arange(n)
+    for step in range(moves):
+        choice = (rng.random(n) * counts[zero]).astype(np.intp)
+        new_zero = neighbours[zero, choice]
+        boards[index, zero] = boards[index, new_zero]
+        boards[index, new_zero] = 0
+        zero = new_zero
+    return boards
+
+def solvable(boards, rows, cols):
+    '''Returns a boolean array telling which of BOARDS can be solved, using
+    the same parity argument as engine.Shape.solvable().'''
+    size = rows * cols
+    # Counting the empty slot as the largest tile, the goal is sorted and
+    # the permutation parity is the parity of the number of inversions.
+    values = np.where(boards == 0, size, boards).astype(np.int16)
+    inversions = np.zeros(len(boards), dtype=np.int64)
+    for i in range(size - 1):
+        inversions += (values[:, i:i + 1] > values[:, i + 1:]).sum(axis=1)
+    zero_row, zero_col = np.divmod(np.argmin(boards, axis=1), cols)
+    distance = (rows - 1 - zero_row) + (cols - 1 - zero_col)
+    return inversions % 2 == distance % 2
+
+def uniform(n, rows=3, cols=3, seed=None):
+    '''Returns N boards drawn uniformly at random among all solvable boards.'''
+    size = rows * cols
+    rng = np.random.default_rng(seed)
+    boards = rng.permuted(np.tile(np.arange(size, dtype=np.uint8), (n, 1)), axis=1)
+    # Swapping two tiles turns every unsolvable board into a solvable one,
+    # and no two unsolvable boards into the same one, so the result stays
+    # uniform. The empty slot must not be one of the two.
+    bad = ~solvable(boards, rows, cols)
+    first = np.where((boards[:, 0] == 0) | (boards[:, 1] == 0), size - 2, 0)
+    rows_to_fix = np.nonzero(bad)[0]
+    a, b = first[rows_to_fix], first[rows_to_fix] + 1
+    boards[rows_to_fix, a], boards[rows_to_fix, b] = boards[rows_to_fix, b], boards[rows_to_fix, a]
+    return boards
+
+def generate(n, rows=3, cols=3, mode="walk", moves=50, seed=None):
+    '''Returns N boards generated in MODE ("walk" or "uniform").'''
+    assert mode in ("walk", "uniform"), "Invalid mode: '{}'".format(mode)
+    if mode == "walk":
+        return walk(n, rows, cols, moves, seed)
+    return uniform(n, rows, cols, seed)
+
+def save(path, boards, rows, cols):
+    '''Writes BOARDS to the .npy file PATH, keeping the board dimensions.'''
+    np.save(path, boards.reshape(len(boards), rows, cols))
+
+def load(path, mmap=True):
+    '''Returns (boards, rows, cols) read from a file written by save().
+    With MMAP, the boards are a read-only view of the file.'''
+    boards = np.load(path, mmap_mode="r" if mmap else None)
+    n, rows, cols = boards.shape
+    return boards.reshape(n, rows * cols), rows, cols
+
+def as_boards(boards, rows, cols):
+    '''Yields each row of BOARDS as a 2D list of ints.'''
+    for tiles in boards:
+        tiles = tiles.tolist()
+        yield [tiles[row * cols:(row + 1) * cols] for row in range(rows)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate shuffled boards into a .npy file.")
+    parser.add_argument("n", type=int, help="number of boards")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--mode", choices=["walk", "uniform"], default="walk")
+    parser.add_argument("--moves", type=int, default=50, help="random moves per board in walk mode")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+    boards = generate(args.n, args.rows, args.cols, args.mode, args.moves, args.seed)
+    save(args.output, boards, args.rows, args.cols)
+    print("Wrote", len(boards), "boards to", args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,545 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Solvers working on the packed states of engine.py.
+#
+# Every solver takes (shape, state, zero, heuristic=None, stats=None) and
+# returns the list of actions leading to shape.goal, or None if the goal
+# cannot be reached. The solvers are registered in SOLVERS so solve() can
+# pick one by name. If STATS (a stats.Stats) is given, the solver reports
+# every state it expands to it, which may stop the search with
+# stats.BudgetExceeded.
+
+from collections import deque # Used as the BFS fringe
+from heapq import heappush, heappop, heapify # Used as the A* open list
+from engine import OPPOSITE, Shape
+import patterns # Pattern database heuristics, when they have been built
+import oracle # Complete distance tables for small boards
+from stats import BUDGET_EXCEEDED, BudgetExceeded, Stats
+
+ANYTIME_WEIGHT = 3.0 # Weight of the heuristic when anytime() starts
+ANYTIME_SECONDS = 10 # Time anytime() is given when it gets no Stats
+
+class ManhattanConflict:
+    '''Manhattan distance plus linear conflicts, for one board Shape.
+
+    The Manhattan distance of a tile is how far it is from its goal cell.
+    Two tiles that are in their goal row (or column) but in reversed order
+    have to get out of each other's way, which costs at least two extra
+    moves. Both parts are admissible and add up to an admissible estimate.
+    '''
+    def __init__(self, shape):
+        self.shape = shape
+        cols = shape.cols
+        goal_pos = {tile: pos for pos, tile in enumerate(shape.goal_tiles)}
+        self.distance = [[0] * shape.size for tile in range(shape.size)]
+        for tile in range(1, shape.size):
+            goal_row, goal_col = divmod(goal_pos[tile], cols)
+            for pos in range(shape.size):
+                row, col = divmod(pos, cols)
+                self.distance[tile][pos] = abs(row - goal_row) + abs(col - goal_col)
+        # A line is (positions, goal key of each tile, index of this line).
+        # A tile belongs to a row line if its goal row is that row, and its
+        # order within the line is given by its goal column (and vice versa).
+        self.rows = [(tuple(range(row * cols, (row + 1) * cols)), row) for row in range(shape.rows)]
+        self.cols = [(tuple(range(col, shape.size, cols)), col) for col in range(cols)]
+        self.row_key = {tile: divmod(goal_pos[tile], cols) for tile in range(1, shape.size)}
+        self.col_key = {tile: divmod(goal_pos[tile], cols)[::-1] for tile in range(1, shape.size)}
+        self.memo = {}
+
+    def estimate(self, state):
+        '''Returns the heuristic value of STATE.'''
+        tiles = self.shape.unpack_tiles(state)
+        h = 0
+        for pos, tile in enumerate(tiles):
+            if tile:
+                h += self.distance[tile][pos]
+        for positions, index in self.rows:
+            h += self._conflicts([tiles[pos] for pos in positions], index, self.row_key)
+        for positions, index in self.cols:
+            h += self._conflicts([tiles[pos] for pos in positions], index, self.col_key)
+        return h
+
+    def update(self, h, state, new_state, zero, new_zero):
+        '''Returns the heuristic value of NEW_STATE, obtained from STATE
+        (whose value is H) by moving the empty slot from ZERO to NEW_ZERO.'''
+        shape = self.shape
+        tile = shape.tile(state, new_zero)
+        h += self.distance[tile][zero] - self.distance[tile][new_zero]
+        if zero // shape.cols == new_zero // shape.cols:
+            # Horizontal move: the tile changes column, both columns change.
+            lines, key = (self.cols[zero % shape.cols], self.cols[new_zero % shape.cols]), self.col_key
+        else:
+            lines, key = (self.rows[zero // shape.cols], self.rows[new_zero // shape.cols]), self.row_key
+        for positions, index in lines:
+            h -= self._conflicts([shape.tile(state, pos) for pos in positions], index, key)
+            h += self._conflicts([shape.tile(new_state, pos) for pos in positions], index, key)
+        return h
+
+    def _conflicts(self, line, index, key):
+        '''Returns the extra moves caused by tiles in LINE that belong to
+        line number INDEX but are not in increasing order.'''
+        order = tuple(key[tile][1] for tile in line if tile and key[tile][0] == index)
+        if len(order) < 2:
+            return 0
+        if order not in self.memo:
+            # Tiles that are not part of the longest increasing subsequence
+            # have to leave the line and come back.
+            longest = [1] * len(order)
+            for i in range(len(order)):
+                for j in range(i):
+                    if order[j] < order[i]:
+                        longest[i] = max(longest[i], longest[j] + 1)
+            self.memo[order] = 2 * (len(order) - max(longest))
+        return self.memo[order]
+
+_heuristics = {}
+
+def get_heuristic(shape):
+    '''Returns the (cached) default heuristic for SHAPE: the pattern
+    database in patterns.PDB_DIR if one was built for this size, else
+    Manhattan distance plus linear conflicts.'''
+    if not shape.standard:
+        return ManhattanConflict(shape) # Custom goals are not worth caching.
+    if shape not in _heuristics:
+        _heuristics[shape] = patterns.load(rows=shape.rows, cols=shape.cols) or ManhattanConflict(shape)
+    return _heuristics[shape]
+
+def set_heuristic(shape, heuristic):
+    '''Makes HEURISTIC the default heuristic for SHAPE, e.g. a
+    patterns.PatternDatabase loaded from a custom location.'''
+    _heuristics[shape] = heuristic
+
+def bfs(shape, state, zero, heuristic=None, stats=None):
+    '''Breadth-first search. Optimal, but explores every state closer
+    to the start than the goal. HEURISTIC is ignored.'''
+    parents = {state: None} # state -> (parent_state, action); doubles as the visited set
+    q = deque()
+    q.append((state, zero, 0)) # The elements on the fringe are (state, zero_position, depth)
+    while q:
+        state, zero, depth = q.popleft()
+        if state == shape.goal:
+            return _actions(parents, state)
+        if stats is not None:
+            stats.expand(depth, len(shape.moves[zero]), len(q), len(parents))
+        for action, new_zero in shape.moves[zero]:
+            new_state = shape.move(state, zero, new_zero)
+            if new_state not in parents:
+                parents[new_state] = (state, action)
+                q.append((new_state, new_zero, depth + 1))
+    return None
+
+def bidirectional(shape, state, zero, heuristic=None, stats=None):
+    '''Breadth-first search from the start and from the goal at the same
+    time, one whole depth at a time on the side with the smaller fringe.
+    Each side only has to go about half as deep as a plain BFS, which
+    makes it visit roughly the square root as many states. HEURISTIC is
+    ignored.'''
+    if state == shape.goal:
+        return []
+    # Each side maps state -> (neighbour, action, depth). Forward, NEIGHBOUR
+    # is the parent and ACTION leads from it to the state; backward,
+    # NEIGHBOUR is one move closer to the goal and ACTION leads to it.
+    forward = {state: (None, None, 0)}
+    backward = {shape.goal: (None, None, 0)}
+    forward_fringe = deque([(state, zero)])
+    backward_fringe = deque([(shape.goal, shape.goal_zero)])
+    while forward_fringe and backward_fringe:
+        if len(forward_fringe) <= len(backward_fringe):
+            meet = _expand(shape, forward_fringe, forward, backward, False, stats)
+        else:
+            meet = _expand(shape, backward_fringe, backward, forward, True, stats)
+        if meet is not None:
+            actions = []
+            node = meet
+            while forward[node][0] is not None:
+                node, action, depth = forward[node]
+                actions.append(action)
+            actions.reverse()
+            node = meet
+            while backward[node][0] is not None:
+                node, action, depth = backward[node]
+                actions.append(action)
+            return actions
+    return None
+
+def _expand(shape, fringe, seen, other, backwards, stats):
+    '''Expands every state of FRINGE at its current depth, recording new
+    states in SEEN. Returns the state shared with OTHER on the shortest
+    combined path, or None if the two searches have not met yet.'''
+    best, best_length = None, None
+    depth = seen[fringe[0][0]][2]
+    while fringe and seen[fringe[0][0]][2] == depth:
+        state, zero = fringe.popleft()
+        if stats is not None:
+            # Depths are counted from the side the state was reached from.
+            stats.expand(depth, len(shape.moves[zero]), len(fringe), len(seen) + len(other))
+        for action, new_zero in shape.moves[zero]:
+            new_state = shape.move(state, zero, new_zero)
+            if new_state in seen:
+                continue
+            seen[new_state] = (state, OPPOSITE[action] if backwards else action, depth + 1)
+            fringe.append((new_state, new_zero))
+            if new_state in other:
+                length = depth + 1 + other[new_state][2]
+                if best is None or length < best_length:
+                    best, best_length = new_state, length
+    return best
+
+def astar(shape, state, zero, heuristic=None, stats=None):
+    '''A* search. Optimal with an admissible HEURISTIC; keeps every
+    generated state in memory, so best suited to small boards.'''
+    heuristic = heuristic or get_heuristic(shape)
+    h = heuristic.estimate(state)
+    if stats is not None:
+        stats.initial_h = h
+    parents = {state: None} # state -> (parent_state, action)
+    costs = {state: 0}
+    fringe = [(h, h, state, zero)] # (f, h, state, zero_position); ties go to the smaller h
+    while fringe:
+        f, h, state, zero = heappop(fringe)
+        g = f - h
+        if g > costs[state]:
+            continue # A cheaper path to this state was found after it was queued.
+        if state == shape.goal:
+            return _actions(parents, state)
+        if stats is not None:
+            stats.expand(g, len(shape.moves[zero]), len(fringe), len(costs))
+        for action, new_zero in shape.moves[zero]:
+            new_state = shape.move(state, zero, new_zero)
+            if new_state not in costs or g + 1 < costs[new_state]:
+                costs[new_state] = g + 1
+                parents[new_state] = (state, action)
+                new_h = heuristic.update(h, state, new_state, zero, new_zero)
+                heappush(fringe, (g + 1 + new_h, new_h, new_state, new_zero))
+    return None
+
+def macro(shape, state, zero):
+    '''Returns a solution of STATE built tile by tile, with no search over
+    whole boards: rows are solved from the top and columns from the left
+    until a 2x2 block is left, which is then turned into place. Each tile
+    is brought to its cell by a breadth-first search over the positions of
+    that tile and of the empty slot, leaving the tiles already placed
+    alone. The solution is usually several times longer than a shortest
+    one, but takes time polynomial in the board size to find, whatever the
+    board. STATE is assumed to be solvable.'''
+    rows, cols = shape.rows, shape.cols
+    tiles = list(shape.unpack_tiles(state))
+    # Solve towards the goal with its empty slot moved to the bottom right
+    # corner, then move it back.
+    goal = list(shape.goal_tiles)
+    pos, back = goal.index(0), []
+    while pos % cols < cols - 1 or pos // cols < rows - 1:
+        new_pos = pos + 1 if pos % cols < cols - 1 else pos + cols
+        goal[pos], goal[new_pos] = goal[new_pos], 0
+        back.append(OPPOSITE["right" if new_pos == pos + 1 else "down"])
+        pos = new_pos
+    locked = [False] * shape.size
+    actions = []
+
+    def slide(new_zero):
+        nonlocal zero
+        actions.append(next(action for action, pos in shape.moves[zero] if pos == new_zero))
+        tiles[zero], tiles[new_zero] = tiles[new_zero], 0
+        zero = new_zero
+
+    def bring(moving, targets, optional=False):
+        '''Moves the tiles MOVING to the cells TARGETS, or the empty slot to
+        TARGETS[0] if MOVING is empty, in as few moves as possible without
+        moving locked tiles. If that cannot be done, returns False when
+        OPTIONAL, and raises AssertionError otherwise.'''
+        start = (tuple(tiles.index(tile) for tile in moving), zero)
+        done = tuple(targets) if moving else None
+        parents = {start: None}
+        fringe = deque([start])
+        while fringe:
+            node = fringe.popleft()
+            positions, empty = node
+            if positions == done or not moving and empty == targets[0]:
+                break
+            for action, new_empty in shape.moves[empty]:
+                if locked[new_empty]:
+                    continue
+                child = (tuple(empty if pos == new_empty else pos for pos in positions), new_empty)
+                if child not in parents:
+                    parents[child] = node
+                    fringe.append(child)
+        else:
+            if optional:
+                return False
+            raise AssertionError("Cannot move {} to {}".format(moving, targets))
+        path = []
+        while parents[node] is not None:
+            path.append(node[1])
+            node = parents[node]
+        for new_zero in reversed(path):
+            slide(new_zero)
+        return True
+
+    def line(cells, across):
+        '''Fills CELLS, a row or column, with their goal tiles. ACROSS is the
+        step from a cell of the line to its neighbour off the line.'''
+        for cell in cells[:-2]:
+            bring([goal[cell]], [cell])
+            locked[cell] = True
+        # The last two tiles go in together: the last one to the cell of the
+        # one before it, that one next to it off the line, then both turn
+        # into place around the empty slot.
+        first, last = cells[-2:]
+        if tiles[first] != goal[first] or tiles[last] != goal[last]:
+            bring([goal[last]], [first])
+            locked[first] = True
+            if not bring([goal[first]], [first + across], optional=True):
+                # Stuck in LAST, a dead end when only two lines are left:
+                # move both tiles at once instead.
+                locked[first] = False
+                bring([goal[last], goal[first]], [first, first + across])
+                locked[first] = True
+            locked[first + across] = True
+            bring([], [last])
+            locked[first] = locked[first + across] = False
+            slide(first)
+            slide(first + across)
+        locked[first] = locked[last] = True
+
+    top, left = 0, 0
+    while rows - top > 2 or cols - left > 2:
+        if rows - top > 2 and (rows - top >= cols - left or cols - left <= 2):
+            line([top * cols + col for col in range(left, cols)], cols)
+            top += 1
+        else:
+            line([row * cols + left for row in range(top, rows)], 1)
+            left += 1
+    block = [top * cols + left, top * cols + left + 1, (top + 1) * cols + left + 1, (top + 1) * cols + left]
+    for i in range(12): # Around the 2x2 block, clockwise
+        if all(tiles[cell] == goal[cell] for cell in block):
+            break
+        slide(block[(block.index(zero) + 1) % 4])
+    assert all(tiles[cell] == goal[cell] for cell in block), "Unsolvable board"
+    # Drop moves that are undone right away.
+    result = []
+    for action in actions + back[::-1]:
+        if result and result[-1] == OPPOSITE[action]:
+            result.pop()
+        else:
+            result.append(action)
+    return result
+
+def anytime(shape, state, zero, heuristic=None, stats=None, weight=ANYTIME_WEIGHT, improved=None):
+    '''Anytime weighted A*, for boards too large to solve optimally.
+
+    A first solution is built by macro() before searching, so there is
+    always one to return, however small the budgets. The search is then
+    ordered by g + WEIGHT * h, which soon finds a shorter solution, and
+    goes on: states whose g + h shows they cannot lead to a shorter
+    solution are dropped, and the weight is brought halfway to 1 after
+    every improvement found by the search. When the budgets of STATS run
+    out, the best solution so far is returned; if the search ends first,
+    it is optimal. A STATS without a time budget is given ANYTIME_SECONDS,
+    as the search rarely ends on large boards.
+
+    No solution can be shorter than the smallest g + h on the open list,
+    so that is a proven lower bound on the optimal length. IMPROVED, if
+    given, is called as IMPROVED(actions, lower_bound) with every better
+    solution, and stats.lower_bound holds the final bound.'''
+    heuristic = heuristic or get_heuristic(shape)
+    stats = stats or Stats()
+    default_seconds = stats.max_seconds is None
+    if default_seconds: # Put back when done, so a reused STATS is not left with it.
+        stats.max_seconds = ANYTIME_SECONDS
+    h = heuristic.estimate(state)
+    stats.initial_h = stats.lower_bound = h
+    parents = {state: None} # state -> (parent_state, action)
+    costs = {state: 0}
+    fringe = [(weight * h, h, 0, state, zero)] # (g + weight * h, h, g, state, zero_position)
+    best = macro(shape, state, zero)
+    if improved:
+        improved(best, stats.lower_bound)
+    try:
+        while fringe:
+            key, h, g, state, zero = heappop(fringe)
+            if g > costs[state] or g + h >= len(best):
+                continue # Superseded by a cheaper path, or cannot improve on BEST.
+            if state == shape.goal:
+                best = _actions(parents, state)
+                weight = max(1.0, (weight + 1) / 2)
+                fringe = [(g + weight * h, h, g, s, z) for key, h, g, s, z in fringe if g + h < len(best)]
+                heapify(fringe)
+                stats.lower_bound = max(stats.lower_bound, min([len(best)] + [g + h for key, h, g, s, z in fringe]))
+                if improved:
+                    improved(best, stats.lower_bound)
+                continue
+            stats.expand(g, len(shape.moves[zero]), len(fringe), len(costs))
+            for action, new_zero in shape.moves[zero]:
+                new_state = shape.move(state, zero, new_zero)
+                if new_state not in costs or g + 1 < costs[new_state]:
+                    new_h = heuristic.update(h, state, new_state, zero, new_zero)
+                    if g + 1 + new_h >= len(best):
+                        continue
+                    costs[new_state] = g + 1
+                    parents[new_state] = (state, action)
+                    heappush(fringe, (g + 1 + weight * new_h, new_h, g + 1, new_state, new_zero))
+    except BudgetExceeded:
+        # The state being expanded has left the fringe but still counts.
+        floor = min([g + h] + [g + h for key, h, g, s, z in fringe])
+        stats.lower_bound = max(stats.lower_bound, min(floor, len(best)))
+        return best
+    finally:
+        if default_seconds:
+            stats.max_seconds = None
+    stats.lower_bound = len(best)
+    return best
+
+def idastar(shape, state, zero, heuristic=None, stats=None):
+    '''Iterative-deepening A*. Optimal with an admissible HEURISTIC and
+    only keeps the current path in memory, which makes it the method of
+    choice for 4x4 boards and up. BOARD is assumed to be solvable.'''
+    heuristic = heuristic or get_heuristic(shape)
+    moves, move, goal, update = shape.moves, shape.move, shape.goal, heuristic.update
+    path = []
+
+    def search(state, zero, prev_zero, g, h, bound):
+        '''Returns True if the goal was found below STATE within BOUND,
+        otherwise the smallest f value that exceeded BOUND.'''
+        if state == goal:
+            return True
+        if stats is not None:
+            stats.expand(g, len(moves[zero]) - (prev_zero is not None), g)
+        smallest = None
+        for action, new_zero in moves[zero]:
+            if new_zero == prev_zero:
+                continue # Never undo the previous move.
+            new_state = move(state, zero, new_zero)
+            new_h = update(h, state, new_state, zero, new_zero)
+            f = g + 1 + new_h
+            if f <= bound:
+                path.append(action)
+                f = search(new_state, new_zero, zero, g + 1, new_h, bound)
+                if f is True:
+                    return True
+                path.pop()
+            if f is not None and (smallest is None or f < smallest):
+                smallest = f
+        return smallest
+
+    h = heuristic.estimate(state)
+    if stats is not None:
+        stats.initial_h = h
+    bound = h
+    while True:
+        result = search(state, zero, None, 0, h, bound)
+        if result is True:
+            return path
+        if result is None:
+            return None
+        bound = result
+
+def _actions(parents, state):
+    '''Follows PARENTS back from STATE and returns the actions in order.'''
+    actions = []
+    while parents[state] is not None:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+SOLVERS = {
+    "bfs": bfs,
+    "bidirectional": bidirectional,
+    "astar": astar,
+    "idastar": idastar,
+    "oracle": oracle.solve,
+    "anytime": anytime,
+}
+
+def choose_solver(shape):
+    '''Returns the name of the default solver for SHAPE.'''
+    if (shape.rows, shape.cols) == (3, 3) and oracle.available(shape):
+        return "oracle"
+    return "astar" if shape.size < 16 else "idastar"
+
+def _flips(shape):
+    '''Yields (cells, actions) for each mirror image of SHAPE's boards:
+    the tile at cell POS goes to cells[POS], and an action on the original
+    board becomes actions[action] on the image.'''
+    for flip_rows in (False, True):
+        for flip_cols in (False, True):
+            cells = []
+            for pos in range(shape.size):
+                row, col = divmod(pos, shape.cols)
+                row = shape.rows - 1 - row if flip_rows else row
+                col = shape.cols - 1 - col if flip_cols else col
+                cells.append(row * shape.cols + col)
+            actions = {
+                "up": "down" if flip_rows else "up",
+                "down": "up" if flip_rows else "down",
+                "left": "right" if flip_cols else "left",
+                "right": "left" if flip_cols else "right",
+            }
+            yield cells, actions
+
+def _mirrored(improved, actions):
+    '''Returns a callback that passes solutions of a mirrored board on to
+    IMPROVED as solutions of the original board.'''
+    def callback(result, lower_bound):
+        improved([actions[action] for action in result], lower_bound)
+    return callback
+
+def solve(shape, tiles, goal_tiles=None, method=None, stats=None, improved=None):
+    '''Returns a shortest list of actions turning the flat board TILES into
+    GOAL_TILES (the goal of SHAPE by default), or None if it is impossible.
+    If STATS is given, the search is recorded in it, and BUDGET_EXCEEDED is
+    returned when one of its budgets stops the search. IMPROVED is handed
+    to the "anytime" method, the only one that accepts it.
+
+    Unsolvable boards are rejected by a parity check before any search.
+    When the empty slot of GOAL_TILES is in a corner, the board is mirrored
+    so that it ends up bottom-right, and the tiles are renamed after the
+    tile the standard goal has in the same cell. The renamed problem has
+    the standard goal, so the oracle tables and pattern databases apply.
+    Other goals are searched for directly, with A* or IDA* in place of
+    "oracle", whose tables only hold the standard goal.'''
+    if stats is not None:
+        stats.begin()
+    goal_tiles = shape.goal_tiles if goal_tiles is None else tuple(goal_tiles)
+    if not shape.solvable(tiles, goal_tiles):
+        if stats is not None:
+            stats.finish("NO_SOLUTION")
+        return None
+    if goal_tiles != shape.goal_tiles:
+        for cells, actions in _flips(shape):
+            if cells[goal_tiles.index(0)] != shape.goal_zero:
+                continue
+            flipped, flipped_goal = [0] * shape.size, [0] * shape.size
+            for pos in range(shape.size):
+                flipped[cells[pos]] = tiles[pos]
+                flipped_goal[cells[pos]] = goal_tiles[pos]
+            names = {tile: shape.goal_tiles[pos] for pos, tile in enumerate(flipped_goal)}
+            renamed = [names[tile] for tile in flipped]
+            if improved is not None:
+                improved = _mirrored(improved, actions)
+            result = solve(shape, renamed, method=method, stats=stats, improved=improved)
+            if result is None or result == BUDGET_EXCEEDED:
+                return result
+            return [actions[action] for action in result]
+        shape = Shape(shape.rows, shape.cols, goal_tiles)
+        if method == "oracle":
+            method = None
+    state, zero = shape.pack_tiles(tiles)
+    solver = SOLVERS[method or choose_solver(shape)]
+    options = {}
+    if improved is not None:
+        assert solver is anytime, "Only the anytime method reports improved solutions."
+        options["improved"] = improved
+    try:
+        actions = solver(shape, state, zero, stats=stats, **options)
+    except BudgetExceeded as budget: # Only possible with STATS, or with "anytime"
+        if stats is not None:
+            stats.finish("{}: {}".format(BUDGET_EXCEEDED, budget))
+        return BUDGET_EXCEEDED
+    if stats is not None:
+        stats.finish("NO_SOLUTION" if actions is None else "SOLVED", actions)
+    return actions
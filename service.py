@@ -0,0 +1,305 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# A local solving service speaking JSON lines, and its client.
+#
+#     python service.py --unix /tmp/puzzle.sock --workers 4
+#     python service.py --port 8765
+#
+# Every request is one JSON object on one line and gets exactly one JSON
+# line back carrying the same "id". Requests may be pipelined on one
+# connection; answers come back as they are ready.
+#
+#     {"id": 1, "op": "solve", "board": [[1,2,3],[4,5,6],[7,0,8]]}
+#     {"id": 1, "solution": ["right"]}
+#
+#     {"id": 2, "op": "health"}   -> {"id": 2, "status": "ok", ...}
+#     {"id": 3, "op": "metrics"}  -> {"id": 3, "metrics": {...}}
+#
+# "solve" also takes "method" (see search.SOLVERS) and "timeout" in seconds,
+# after which the solution is "BUDGET_EXCEEDED". Solving happens in a pool
+# of worker processes so the event loop never blocks. Concurrent requests
+# for the same board share one computation, and at most QUEUE distinct
+# boards wait for a worker: beyond that the server stops reading from the
+# connections that send more, which pushes back on the clients. Ctrl-C or
+# SIGTERM closes the connections and stops the server.
+
+import argparse # Used by the command line tool
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from cache import SolutionCache
+from puzzle import solve
+from stats import Stats, percentile
+
+ERROR = "ERROR" # Solution of a request that made the solver fail
+LATENCY_WINDOW = 10000 # Number of recent requests the latency percentiles cover
+
+_cache = None # Per worker process
+
+def _ignore_interrupts():
+    '''Runs in every worker process. Ctrl-C reaches the whole process
+    group; only the server handles it, by closing the pool.'''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _solve(board, method, timeout):
+    '''Runs in a worker process. Returns what puzzle.solve() returns.'''
+    global _cache
+    if _cache is None:
+        _cache = SolutionCache()
+    stats = Stats(max_seconds=timeout, interval=1024) if timeout else None
+    return solve(board, method, stats=stats, cache=_cache)
+
+class Server:
+    '''Solving service running WORKERS processes, with at most QUEUE
+    distinct boards waiting for them.'''
+    def __init__(self, workers=None, queue=256):
+        self.workers = workers or os.cpu_count() or 1
+        # Forked workers would inherit the sockets of open connections and
+        # keep them open after close(); the fork server's children do not.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver") if "forkserver" in methods else None
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                        initializer=_ignore_interrupts)
+        self.queue = asyncio.Queue(maxsize=queue)
+        self.pending = {} # request key -> future shared by every request for it
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"requests": 0, "solved": 0, "unsolved": 0, "errors": 0, "coalesced": 0, "connections": 0}
+        self.started = time.time()
+        self.dispatchers = []
+        self.connections = {} # connection handler task -> its writer
+
+    async def start(self, host="127.0.0.1", port=8765, unix=None):
+        '''Starts listening on the Unix socket UNIX, or on HOST:PORT.'''
+        self.dispatchers = [asyncio.ensure_future(self._dispatch()) for i in range(self.workers)]
+        if unix:
+            if os.path.exists(unix):
+                os.remove(unix)
+            self.server = await asyncio.start_unix_server(self._connection, path=unix)
+        else:
+            self.server = await asyncio.start_server(self._connection, host, port)
+        return self.server
+
+    async def close(self):
+        '''Stops listening, closes every connection and drops the requests
+        still waiting. Boards already handed to a worker are not waited for,
+        so closing never blocks the event loop.'''
+        self.server.close()
+        for task, writer in list(self.connections.items()):
+            writer.close()
+            task.cancel()
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        for future in list(self.pending.values()):
+            future.cancel()
+        await asyncio.gather(*self.connections, *self.dispatchers, return_exceptions=True)
+        await self.server.wait_closed()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _dispatch(self):
+        '''Hands queued boards to the worker pool, one at a time.'''
+        loop = asyncio.get_running_loop()
+        while True:
+            key, board, method, timeout, future = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self.pool, _solve, board, method, timeout)
+            except Exception: # Only close() may stop a dispatcher, by cancelling it.
+                result = ERROR
+            finally:
+                del self.pending[key]
+            if not future.done(): # Cancelled by close()
+                future.set_result(result)
+
+    async def _connection(self, reader, writer):
+        self.counters["connections"] += 1
+        self.connections[asyncio.current_task()] = writer
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self._reply(writer, {"id": None, "error": "invalid JSON"})
+                    continue
+                if not isinstance(request, dict):
+                    self._reply(writer, {"id": None, "error": "requests must be JSON objects"})
+                    continue
+                if request.get("op", "solve") == "solve":
+                    start = time.perf_counter() # Latency includes waiting for the queue.
+                    future = await self._submit(request) # Waits here when the queue is full.
+                    task = asyncio.ensure_future(self._answer(writer, request, future, start))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    self._reply(writer, self._info(request))
+                await writer.drain()
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, asyncio.CancelledError): # Cancelled by close()
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            del self.connections[asyncio.current_task()]
+            writer.close()
+
+    async def _submit(self, request):
+        '''Returns the future of the computation for REQUEST, starting one
+        unless the same board is already being solved.'''
+        self.counters["requests"] += 1
+        board = request.get("board")
+        method, timeout = request.get("method"), request.get("timeout")
+        key = json.dumps([board, method, timeout])
+        if key in self.pending:
+            self.counters["coalesced"] += 1
+            return self.pending[key]
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        await self.queue.put((key, board, method, timeout, future))
+        return future
+
+    async def _answer(self, writer, request, future, start):
+        # FUTURE is shared with the requests for the same board on other
+        # connections, so this one dropping must not cancel it.
+        solution = await asyncio.shield(future)
+        self.latencies.append(time.perf_counter() - start)
+        if isinstance(solution, list):
+            self.counters["solved"] += 1
+        elif solution == ERROR:
+            self.counters["errors"] += 1
+        else: # NO_SOLUTION or BUDGET_EXCEEDED
+            self.counters["unsolved"] += 1
+        self._reply(writer, {"id": request.get("id"), "solution": solution})
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _info(self, request):
+        '''Answers the "health" and "metrics" operations.'''
+        op = request.get("op")
+        if op == "health":
+            return {"id": request.get("id"), "status": "ok", "uptime": time.time() - self.started,
+                    "workers": self.workers, "queued": self.queue.qsize()}
+        if op == "metrics":
+            return {"id": request.get("id"), "metrics": self.metrics()}
+        return {"id": request.get("id"), "error": "unknown op: {}".format(op)}
+
+    def metrics(self):
+        '''Returns the counters, queue state and latency percentiles (ms).'''
+        metrics = dict(self.counters)
+        metrics.update(queued=self.queue.qsize(), in_flight=len(self.pending), uptime=time.time() - self.started)
+        for p in (50, 95, 99):
+            metrics["p{}_ms".format(p)] = 1000 * percentile(self.latencies, p) if self.latencies else None
+        return metrics
+
+    def _reply(self, writer, response):
+        writer.write(json.dumps(response).encode() + b"\n")
+
+class Client:
+    '''Asynchronous client. Requests can be sent concurrently from many
+    tasks over the one connection.
+
+        client = await Client.connect(unix="/tmp/puzzle.sock")
+        actions = await client.solve(board)
+    '''
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = {} # request id -> future of its response
+        self.next_id = 0
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix, limit=1 << 24)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.waiting.pop(response.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self.waiting.values():
+            if not future.done(): # Not cancelled by the requester meanwhile
+                future.set_exception(ConnectionError("connection closed by the server"))
+
+    async def request(self, **request):
+        '''Sends REQUEST and returns the response as a dict.'''
+        self.next_id += 1
+        request["id"] = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+        try:
+            self.writer.write(json.dumps(request).encode() + b"\n")
+            await self.writer.drain()
+            return await future
+        finally: # Answered, or given up on, e.g. by asyncio.wait_for()
+            self.waiting.pop(request["id"], None)
+
+    async def solve(self, board, method=None, timeout=None):
+        '''Returns what puzzle.solve(BOARD) would, computed by the server.'''
+        response = await self.request(op="solve", board=board, method=method, timeout=timeout)
+        return response.get("solution", response.get("error"))
+
+    async def health(self):
+        return await self.request(op="health")
+
+    async def metrics(self):
+        return (await self.request(op="metrics"))["metrics"]
+
+    async def close(self):
+        self.writer.close()
+        self.receiver.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the sliding puzzle solving service.")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default: all cores)")
+    parser.add_argument("--queue", type=int, default=256, help="distinct boards allowed to wait for a worker")
+    args = parser.parse_args(argv)
+
+    async def serve():
+        server = Server(args.workers, args.queue)
+        await server.start(args.host, args.port, args.unix)
+        print("Listening on", args.unix or "{}:{}".format(args.host, args.port), flush=True)
+        # A signal handler of the loop wakes it up at once, even while the
+        # pool's threads are the ones receiving the signal.
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+            except NotImplementedError: # Windows, where Ctrl-C raises KeyboardInterrupt
+                pass
+        try:
+            await stop.wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
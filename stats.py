@@ -0,0 +1,163 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Search statistics and resource budgets.
+#
+# A Stats object passed to a solver (or to puzzle.solve()) is told about
+# every state the solver expands. It counts them, keeps track of the size
+# of the fringe and of the set of visited states, and stops the search by
+# raising BudgetExceeded once a node, time or memory budget is used up.
+# Solvers only touch it when one is given, so searching without one costs
+# nothing extra.
+#
+#     stats = Stats(max_seconds=5, callback=print_progress)
+#     actions = puzzle.solve(board, stats=stats)
+#     if actions == "BUDGET_EXCEEDED": ...
+
+import math
+import os
+import time
+
+BUDGET_EXCEEDED = "BUDGET_EXCEEDED" # Result of a search stopped by a budget
+
+class BudgetExceeded(Exception):
+    '''Raised inside a solver when a budget of its Stats is used up.
+    The message names the budget: "nodes", "time" or "memory".'''
+
+def memory_used():
+    '''Returns the resident memory of this process in bytes, or None if it
+    cannot be measured on this platform.'''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource # Not available on Windows
+        # Peak rather than current size; kilobytes on Linux, bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except (ImportError, AttributeError):
+        return None
+
+def percentile(samples, p):
+    '''Returns the P-th percentile of SAMPLES (nearest rank).'''
+    samples = sorted(samples)
+    return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+class Stats:
+    '''Statistics of one search, with optional budgets.
+
+    MAX_NODES limits the number of expanded states, MAX_SECONDS the
+    elapsed time and MAX_MEMORY the resident memory of the process in
+    bytes. Time and memory are checked, and CALLBACK(stats) is called,
+    every INTERVAL expanded states and once more when the search ends.
+
+    After the search:
+        expanded, generated: states expanded and generated
+        per_depth:           {depth: states expanded at that depth}
+        peak_fringe:         largest number of states waiting to be expanded
+        peak_visited:        largest number of states remembered as visited
+        elapsed:             seconds spent searching
+        initial_h:           heuristic value of the start, if one was used
+        lower_bound:         proven minimum solution length (anytime search only)
+        solution_length:     number of actions found, or None
+        status:              "SOLVED", "NO_SOLUTION" or "BUDGET_EXCEEDED: <budget>"
+    '''
+    def __init__(self, max_nodes=None, max_seconds=None, max_memory=None, callback=None, interval=4096):
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.max_memory = max_memory
+        self.callback = callback
+        self.interval = interval
+        self.begin()
+
+    def begin(self):
+        '''Clears the statistics and restarts the clock. search.solve() calls
+        it when the search starts, so time spent before it does not count
+        against MAX_SECONDS, and a Stats used again only reports the last
+        search.'''
+        self.expanded = 0
+        self.generated = 0
+        self.per_depth = {}
+        self.peak_fringe = 0
+        self.peak_visited = 0
+        self.elapsed = 0.0
+        self.initial_h = None
+        self.lower_bound = None
+        self.solution_length = None
+        self.status = None
+        self.start = time.perf_counter()
+
+    def expand(self, depth, generated, fringe=0, visited=0):
+        '''Records the expansion of a state at DEPTH that generated
+        GENERATED children, with FRINGE states waiting and VISITED states
+        remembered. Raises BudgetExceeded when a budget is used up.'''
+        self.expanded += 1
+        self.generated += generated
+        self.per_depth[depth] = self.per_depth.get(depth, 0) + 1
+        if fringe > self.peak_fringe:
+            self.peak_fringe = fringe
+        if visited > self.peak_visited:
+            self.peak_visited = visited
+        if self.max_nodes is not None and self.expanded > self.max_nodes:
+            raise BudgetExceeded("nodes")
+        if self.expanded % self.interval == 0:
+            self.check()
+
+    def check(self):
+        '''Checks the time and memory budgets and reports progress.'''
+        self.elapsed = time.perf_counter() - self.start
+        if self.max_seconds is not None and self.elapsed > self.max_seconds:
+            raise BudgetExceeded("time")
+        if self.max_memory is not None:
+            used = memory_used()
+            if used is not None and used > self.max_memory:
+                raise BudgetExceeded("memory")
+        if self.callback:
+            self.callback(self)
+
+    def finish(self, status, actions=None):
+        '''Records the end of the search.'''
+        self.elapsed = time.perf_counter() - self.start
+        self.status = status
+        self.solution_length = len(actions) if actions is not None else None
+        if self.callback:
+            self.callback(self)
+
+    @property
+    def heuristic_quality(self):
+        '''Initial heuristic value over solution length: 1.0 is a perfect
+        estimate, lower values mean a weaker heuristic.'''
+        if self.initial_h is None or not self.solution_length:
+            return None
+        return self.initial_h / self.solution_length
+
+    @property
+    def suboptimality(self):
+        '''Solution length over the proven lower bound: the solution is at
+        most this many times longer than a shortest one.'''
+        if not self.lower_bound or self.solution_length is None:
+            return None
+        return self.solution_length / self.lower_bound
+
+    def as_dict(self):
+        '''Returns the statistics as a dict, e.g. for json.dumps().'''
+        return {
+            "status": self.status,
+            "expanded": self.expanded,
+            "generated": self.generated,
+            "per_depth": dict(sorted(self.per_depth.items())),
+            "peak_fringe": self.peak_fringe,
+            "peak_visited": self.peak_visited,
+            "elapsed": self.elapsed,
+            "nodes_per_s": self.expanded / self.elapsed if self.elapsed else 0.0,
+            "initial_h": self.initial_h,
+            "solution_length": self.solution_length,
+            "heuristic_quality": self.heuristic_quality,
+            "lower_bound": self.lower_bound,
+            "suboptimality": self.suboptimality,
+        }
@@ -0,0 +1,420 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Checks of the solvers against each other and against a plain replay of
+# the moves, on boards small enough for breadth-first search.
+#
+#     python test_search.py [seed]
+
+import asyncio
+import io
+import os
+import random
+import socket
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+import external
+import oracle
+import patterns
+import render
+import scramble
+import validate
+from batch import solve_many, TIMEOUT
+from cache import ENTRY_OVERHEAD, SolutionCache
+from engine import get_shape
+from puzzle import is_solvable, solve, visualize
+from service import Client, Server
+from search import SOLVERS
+from stats import Stats
+
+DELTAS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+SIZES = [(2, 3), (3, 3), (2, 4)]
+
+def replay(board, actions):
+    '''Returns the board after taking ACTIONS on BOARD, or None if one of
+    them is illegal. Works from rows and columns only, not from the engine.'''
+    board = [row[:] for row in board]
+    row, col = find_zero(board)
+    for action in actions:
+        if action not in DELTAS:
+            return None
+        new_row, new_col = row + DELTAS[action][0], col + DELTAS[action][1]
+        if not (0 <= new_row < len(board) and 0 <= new_col < len(board[0])):
+            return None
+        board[row][col], board[new_row][new_col] = board[new_row][new_col], 0
+        row, col = new_row, new_col
+    return board
+
+def find_zero(board):
+    return next((r, c) for r in range(len(board)) for c in range(len(board[0])) if board[r][c] == 0)
+
+def goal_board(rows, cols):
+    tiles = list(range(1, rows * cols)) + [0]
+    return [tiles[row * cols:(row + 1) * cols] for row in range(rows)]
+
+def scrambled(board, moves, rng):
+    '''Returns BOARD after MOVES random legal moves.'''
+    for i in range(moves):
+        while True:
+            result = replay(board, [rng.choice(list(DELTAS))])
+            if result is not None:
+                board = result
+                break
+    return board
+
+def swapped(board):
+    '''Returns BOARD with two tiles exchanged, which makes it unsolvable.'''
+    tiles = [tile for row in board for tile in row if tile]
+    board = [[{tiles[0]: tiles[1], tiles[1]: tiles[0]}.get(tile, tile) for tile in row] for row in board]
+    return board
+
+def test_solvers_agree(seed=0):
+    '''Every method solves random boards in as few moves as BFS and
+    bidirectional BFS, and rejects unsolvable ones.'''
+    rng = random.Random(seed)
+    for rows, cols in SIZES:
+        for i in range(8):
+            board = scrambled(goal_board(rows, cols), 10 + 10 * i, rng)
+            shortest = len(solve(board, "bfs"))
+            assert len(solve(board, "bidirectional")) == shortest
+            for method in SOLVERS:
+                actions = solve(board, method)
+                assert replay(board, actions) == goal_board(rows, cols), (method, board, actions)
+                assert len(actions) == shortest, (method, board, actions, shortest)
+                assert solve(swapped(board), method) == "NO_SOLUTION", (method, board)
+
+def test_pattern_database(seed=0):
+    '''A pattern database never overestimates the distance to the goal,
+    and update() agrees with estimate() after every move.'''
+    rng = random.Random(seed)
+    shape = get_shape(2, 4)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "2x4.pdb")
+        patterns.build(2, 4, patterns.split_tiles(shape, "4-3"), path)
+        database = patterns.load(path)
+        for i in range(200):
+            board = scrambled(goal_board(2, 4), 40, rng)
+            state, zero = shape.pack(board)
+            h = database.estimate(state)
+            assert h <= oracle.distance(shape, state), board
+            for action, new_zero in shape.moves[zero]:
+                new_state = shape.move(state, zero, new_zero)
+                assert database.update(h, state, new_state, zero, new_zero) == database.estimate(new_state)
+        database.data.close()
+
+def test_cache_reflection(seed=0):
+    '''A cached solution also answers the mirror image of its board and
+    every board along the way.'''
+    rng = random.Random(seed)
+    shape = get_shape(3, 3)
+    goal = goal_board(3, 3)
+    # The tile at goal cell (r, c) of the mirror image is the one at (c, r).
+    names = {goal[r][c]: goal[c][r] for r in range(3) for c in range(3)}
+    for i in range(20):
+        cache = SolutionCache()
+        board = scrambled(goal, 30, rng)
+        actions = solve(board, cache=cache)
+        mirrored = [[names[board[c][r]] for c in range(3)] for r in range(3)]
+        hit = cache.get(shape, shape.pack(mirrored)[0])
+        assert replay(mirrored, hit) == goal and len(hit) == len(actions), (board, hit)
+        for step in range(len(actions) + 1):
+            rest = cache.get(shape, shape.pack(replay(board, actions[:step]))[0])
+            assert rest == actions[step:], (board, step)
+        stats = Stats()
+        assert solve(board, stats=stats, cache=cache) == actions
+        assert stats.status == "SOLVED" and stats.solution_length == len(actions) and stats.expanded == 0
+        # Invalid arguments fail on a hit as they do on a miss.
+        for method, improved in (("nosuch", None), ("astar", print)):
+            try:
+                solve(board, method, cache=cache, improved=improved)
+            except AssertionError:
+                continue
+            assert False, (method, improved)
+
+def test_cache_budget():
+    '''With room for only a few entries, the board just solved is kept,
+    along with the boards nearest to it on the way to the goal.'''
+    board = [[8,6,7],[2,5,4],[3,0,1]]
+    shape = get_shape(3, 3)
+    cache = SolutionCache(max_bytes=10 * (ENTRY_OVERHEAD + 8))
+    actions = solve(board, cache=cache)
+    assert len(cache) < len(actions) + 1 and cache.evictions
+    assert cache.get(shape, shape.pack(board)[0]) == actions
+    assert cache.get(shape, shape.pack(replay(board, actions[:1]))[0]) == actions[1:]
+
+def test_external_matches_oracle(seed=0):
+    '''The disk-backed BFS finds every state at the distance the oracle
+    table gives it, also when the runs of a layer take several merge
+    passes.'''
+    rng = random.Random(seed)
+    shape = get_shape(2, 4)
+    table = oracle.build(shape)
+    expected = [0] * 64
+    for entry in table:
+        if entry != oracle.UNSOLVABLE:
+            expected[entry & 63] += 1
+    with tempfile.TemporaryDirectory() as workdir:
+        histogram = external.enumerate_layers(2, 4, workdir, chunk=1000)
+        assert histogram == expected[:len(histogram)] and sum(histogram) == sum(expected)
+        many = os.path.join(workdir, "many") # Hundreds of runs, merged 4 at a time
+        assert external.enumerate_layers(2, 4, many, chunk=10, fan_in=4) == histogram
+        assert not [name for name in os.listdir(many) if name.startswith("run-")]
+        path = os.path.join(workdir, "2x4.dist")
+        external.write_table(workdir, path)
+        for i in range(100):
+            tiles = [tile for row in scrambled(goal_board(2, 4), 50, rng) for tile in row]
+            assert external.lookup(path, 2, 4, tiles) == oracle.distance(shape, shape.pack_tiles(tiles)[0]), tiles
+        assert oracle.distance(shape, shape.pack(swapped(goal_board(2, 4)))[0]) is None
+
+def test_custom_goals(seed=0):
+    '''Every method reaches a goal that is not the standard one, with the
+    empty slot in a corner (solved by mirroring) or elsewhere (searched
+    directly), in as few moves as BFS.'''
+    rng = random.Random(seed)
+    for rows, cols in SIZES:
+        for i in range(6):
+            goal = scrambled(goal_board(rows, cols), 30 + i, rng)
+            if i < 2: # Empty slot in the top left corner
+                row, col = find_zero(goal)
+                goal = replay(goal, ["up"] * row + ["left"] * col)
+            board = scrambled(goal, 15, rng)
+            shortest = len(solve(board, "bfs", goal))
+            for method in SOLVERS:
+                actions = solve(board, method, goal)
+                assert replay(board, actions) == goal, (method, board, goal, actions)
+                assert len(actions) == shortest, (method, board, goal, actions, shortest)
+            assert solve(swapped(board), goal=goal) == "NO_SOLUTION"
+
+def test_anytime_streams_solutions(seed=0):
+    '''Solutions passed to IMPROVED are valid, get shorter, never beat the
+    lower bound, and end with the one returned, also for mirrored goals.
+    A Stats passed in keeps no time budget it did not set.'''
+    rng = random.Random(seed)
+    for goal in (goal_board(3, 3), [[0,1,2],[3,4,5],[6,7,8]]):
+        board = scrambled(goal, 40, rng)
+        found = []
+        stats = Stats()
+        actions = solve(board, "anytime", goal, stats, improved=lambda actions, bound: found.append((actions, bound)))
+        assert stats.max_seconds is None # ANYTIME_SECONDS only applied to this search
+        assert found and found[-1][0] == actions and stats.lower_bound == len(actions)
+        for (actions, bound), (later, later_bound) in zip(found, found[1:]):
+            assert len(later) < len(actions) and bound <= later_bound
+        for actions, bound in found:
+            assert replay(board, actions) == goal and bound <= len(actions)
+        assert isinstance(solve(board, "astar", goal, stats), list) and stats.max_seconds is None
+
+def test_anytime_large(seed=0):
+    '''"anytime" returns a solution of 5x5 boards within small budgets,
+    even when they stop the search at once.'''
+    boards = scramble.uniform(5, 5, 5, seed).tolist()
+    for i, tiles in enumerate(boards):
+        board = [tiles[row * 5:(row + 1) * 5] for row in range(5)]
+        stats = Stats(max_nodes=1) if i == 0 else Stats(max_seconds=0.2, interval=256)
+        start = time.perf_counter()
+        actions = solve(board, "anytime", stats=stats)
+        assert time.perf_counter() - start < 1, (board, stats.status)
+        assert replay(board, actions) == goal_board(5, 5), board
+        assert stats.lower_bound <= len(actions) and stats.status == "SOLVED"
+
+def test_scramble(seed=0):
+    '''scramble.solvable() agrees with the engine on random boards of every
+    shape, walk() and uniform() only make solvable boards, uniform() makes
+    every one of them, and a seed always gives the same boards.'''
+    rng = random.Random(seed)
+    for rows, cols in SIZES + [(3, 2), (3, 4), (4, 3), (2, 5)]:
+        shape = get_shape(rows, cols)
+        boards = [rng.sample(range(rows * cols), rows * cols) for i in range(500)]
+        expected = [shape.solvable(tiles) for tiles in boards]
+        assert scramble.solvable(np.array(boards, dtype=np.uint8), rows, cols).tolist() == expected
+        for mode in ("walk", "uniform"):
+            boards = scramble.generate(500, rows, cols, mode, moves=31, seed=seed)
+            assert all(sorted(tiles) == list(range(rows * cols)) and shape.solvable(tiles) for tiles in boards.tolist()), mode
+            assert (boards == scramble.generate(500, rows, cols, mode, moves=31, seed=seed)).all(), mode
+            assert not (boards == scramble.generate(500, rows, cols, mode, moves=31, seed=seed + 1)).all(), mode
+    boards = scramble.uniform(20000, 2, 3, seed)
+    assert len({tuple(tiles) for tiles in boards.tolist()}) == 360 # Half of the 6! boards
+
+def test_stats_restart(seed=0):
+    '''A Stats counts from the start of each search: time before it does
+    not use up MAX_SECONDS, and reusing one does not add up the counts.'''
+    rng = random.Random(seed)
+    stats = Stats(max_seconds=0.2)
+    time.sleep(0.3)
+    board = scrambled(goal_board(3, 3), 30, rng)
+    assert isinstance(solve(board, "astar", stats=stats), list)
+    assert stats.status == "SOLVED" and stats.elapsed < 0.2
+    other = scrambled(goal_board(3, 3), 30, rng)
+    fresh = Stats()
+    solve(other, "astar", stats=fresh)
+    solve(other, "astar", stats=stats)
+    timing = {"elapsed": 0, "nodes_per_s": 0}
+    assert dict(stats.as_dict(), **timing) == dict(fresh.as_dict(), **timing)
+
+def test_service_disconnect(seed=0):
+    '''A client dropping its connection does not take away the answer of
+    another client waiting for the same board, nor stop the server.'''
+    rng = random.Random(seed)
+    board = scrambled(goal_board(4, 4), 40, rng)
+
+    async def run():
+        server = Server(workers=1)
+        await server.start(port=0)
+        port = server.server.sockets[0].getsockname()[1]
+        first, second = await Client.connect(port=port), await Client.connect(port=port)
+        try:
+            dropped = asyncio.ensure_future(first.solve(board))
+            await first.health() # The server has read the solve request by now.
+            waiting = asyncio.ensure_future(second.solve(board))
+            await second.health()
+            assert (await second.metrics())["coalesced"] == 1
+            # Reset rather than close the connection, so the server gives up on it.
+            sock = first.writer.get_extra_info("socket")
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            first.writer.transport.abort()
+            dropped.cancel()
+            actions = await asyncio.wait_for(waiting, 60)
+            assert replay(board, actions) == goal_board(4, 4), actions
+            assert await asyncio.wait_for(second.solve([[1,2,3],[4,5,6],[7,0,8]]), 60) == ["right"]
+        finally:
+            await first.close()
+            await second.close()
+            await server.close()
+
+    asyncio.run(run())
+
+def test_solve_many(seed=0):
+    '''solve_many() solves repeated boards once, yields in input order only
+    when asked to, and times out a hard board without holding up the
+    others, in this process and in a pool.'''
+    rng = random.Random(seed)
+    hard = [[0,15,14,13],[12,11,10,9],[8,7,6,5],[4,3,2,1]]
+    easy = [scrambled(goal_board(4, 4), 10, rng) for i in range(6)]
+    boards = [hard] + easy + easy[:3]
+    for workers in (1, 2):
+        for ordered in (False, True):
+            results = list(solve_many(boards, workers, ordered, timeout=0.5, chunksize=1))
+            indices = [index for index, result in results]
+            assert sorted(indices) == list(range(len(boards))), (workers, ordered, indices)
+            if ordered:
+                assert indices == list(range(len(boards)))
+            elif workers == 2: # The easy boards finish while the hard one runs.
+                assert indices[0] != 0 and indices[-1] == 0, indices
+            else: # One solve per distinct board, so repeats come out with the first.
+                for i in range(3):
+                    assert indices[indices.index(1 + i) + 1] == 7 + i, indices
+            results = dict(results)
+            assert results[0] == TIMEOUT
+            for index, board in enumerate(boards[1:], 1):
+                assert replay(board, results[index]) == goal_board(4, 4), (index, results[index])
+
+def test_invalid_goal():
+    '''A goal of other dimensions than the board, or with tiles missing, is
+    rejected rather than solved or declared unsolvable.'''
+    for board, goal in (([[1,2,3],[4,5,0]], [[1,2],[3,4],[5,0]]), ([[1,2,3],[4,5,0]], [[1,1,3],[4,5,0]])):
+        for check in (lambda: solve(board, goal=goal), lambda: is_solvable(board, goal)):
+            try:
+                check()
+            except AssertionError:
+                continue
+            assert False, (board, goal)
+
+def test_stats_budgets():
+    '''Each budget stops A* and IDA* on a board far too deep for them, and
+    the status names the budget.'''
+    board = [[0,15,14,13],[12,11,10,9],[8,7,6,5],[4,3,2,1]]
+    budgets = {"nodes": {"max_nodes": 1000}, "time": {"max_seconds": 0.05}, "memory": {"max_memory": 1}}
+    for method in ("astar", "idastar"):
+        for budget, options in budgets.items():
+            stats = Stats(interval=256, **options)
+            assert solve(board, method, stats=stats) == "BUDGET_EXCEEDED", (method, budget)
+            assert stats.status == "BUDGET_EXCEEDED: " + budget, (method, stats.status)
+            assert stats.solution_length is None
+            if budget != "time": # Stopped as soon as the budget was checked
+                assert stats.expanded == (1001 if budget == "nodes" else 256), (method, budget, stats.expanded)
+
+def test_render(seed=0):
+    '''draw() keeps the original 3x3 layout and widens every cell of boards
+    with two-digit tiles; a headless replay with DIFF writes the first board
+    and then one line per action, without waiting between them.'''
+    assert render.draw([[4,3,6],[0,5,7],[1,8,2]]) == (
+        "-------------\n| 4 | 3 | 6 |\n-------------\n|   | 5 | 7 |\n"
+        "-------------\n| 1 | 8 | 2 |\n-------------\n")
+    lines = render.draw(goal_board(4, 4)).splitlines()
+    assert lines[0] == "-" * 21 and lines[1] == "|  1 |  2 |  3 |  4 |" and lines[7] == "| 13 | 14 | 15 |    |"
+    assert len({len(line) for line in lines}) == 1
+    rng = random.Random(seed)
+    board = scrambled(goal_board(3, 4), 20, rng)
+    actions = solve(board)
+    out = io.StringIO()
+    final = render.replay(board, actions, fps=0, out=out, diff=True)
+    assert final == goal_board(3, 4)
+    first = "Step 0/{}\n{}\n".format(len(actions), render.draw(board))
+    assert out.getvalue().startswith(first)
+    steps = out.getvalue()[len(first):].splitlines()
+    assert [line.split(":")[0] for line in steps] == [str(step) for step in range(1, len(actions) + 1)]
+    assert [line.split()[1] for line in steps] == actions
+    start = time.perf_counter() # Headless output is not paced unless FPS is given.
+    visualize(board, actions, out=io.StringIO())
+    assert time.perf_counter() - start < 1, len(actions)
+
+def test_oracle_custom_goal():
+    '''"oracle" used to answer custom goals with a solution for the standard one.'''
+    board, goal = [[4,1,2],[0,5,3],[7,8,6]], [[1,2,3],[4,0,5],[7,8,6]]
+    assert replay(board, solve(board, "oracle", goal)) == goal
+
+def test_validate(seed=0):
+    '''validate() and failures() agree with replay() on correct, truncated
+    and illegal solutions, and accept an empty batch.'''
+    rng = random.Random(seed)
+    for rows, cols in SIZES:
+        goal = goal_board(rows, cols)
+        boards, solutions = [], []
+        for i in range(30):
+            board = scrambled(goal, 20 + i, rng)
+            actions = solve(board)
+            if i % 3 == 1:
+                actions = actions[:rng.randrange(len(actions) + 1)]
+            elif i % 3 == 2: # One illegal action somewhere, maybe at the very end
+                while True:
+                    step = rng.randrange(len(actions) + 1)
+                    action = rng.choice(list(DELTAS))
+                    if replay(board, actions[:step] + [action]) is None:
+                        break
+                actions = actions[:step] + [action] + actions[step:]
+            boards.append([tile for row in board for tile in row])
+            solutions.append(actions)
+        moves, lengths = validate.encode(solutions)
+        legal, solved, failed_at = validate.validate(np.array(boards, dtype=np.uint8), moves, lengths, rows, cols)
+        failed = dict(validate.failures(boards, moves, lengths, rows, cols))
+        for row, (tiles, actions) in enumerate(zip(boards, solutions)):
+            board = [tiles[r * cols:(r + 1) * cols] for r in range(rows)]
+            assert validate.decode(moves, lengths, row) == actions
+            first = next((t for t in range(len(actions)) if replay(board, actions[:t + 1]) is None), -1)
+            assert failed_at[row] == first and legal[row] == (first < 0), (board, actions)
+            assert solved[row] == (replay(board, actions) == goal), (board, actions)
+            assert (row in failed) == (not solved[row])
+            if row in failed:
+                legal_part = actions[:first] if first >= 0 else actions
+                assert [action for tiles, action in failed[row][1:]] == legal_part
+                assert failed[row][-1][0] == [tile for line in replay(board, legal_part) for tile in line]
+    moves, lengths = validate.encode([])
+    assert moves.shape[0] == len(lengths) == 0
+    assert [len(result) for result in validate.validate([], moves, lengths, 3, 3)] == [0, 0, 0]
+    assert list(validate.failures([], moves, lengths, 3, 3)) == []
+
+if __name__ == '__main__':
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    tests = [(name, test) for name, test in sorted(globals().items()) if name.startswith("test_")]
+    for name, test in tests:
+        print("Running", name, "...")
+        if "seed" in test.__code__.co_varnames[:test.__code__.co_argcount]:
+            test(seed)
+        else:
+            test()
+    print("All tests passed.")
@@ -0,0 +1,113 @@
+#################################
+## Project: Sliding Puzzle     ##
+## Copyright ReadyPython Sp19  ##
+## All rights reserved.        ##
+#################################
+
+# Checking many solutions at once with NumPy.
+#
+# Start boards are rows of a uint8 array of shape (N, rows * cols), as made
+# by scramble.py. Solutions are packed 4 moves per byte, 2 bits per move
+# holding the index of the action in ACTIONS (see encode()). validate()
+# plays move number t of every solution at the same time, so the cost is
+# one pass of array operations per move rather than per move per board.
+#
+# Moves and the goal are worked out here from rows and columns alone, not
+# taken from engine.py, so a mistake in the solvers' move tables cannot
+# make their own solutions look right.
+
+import numpy as np
+from engine import ACTIONS
+
+DELTAS = {"up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+def targets(rows, cols):
+    '''Returns a list where targets[pos][a] is the cell the empty slot
+    moves to from cell POS with action number A, or -1 if it is illegal.'''
+    result = []
+    for pos in range(rows * cols):
+        row, col = divmod(pos, cols)
+        cells = []
+        for action in ACTIONS:
+            new_row, new_col = row + DELTAS[action][0], col + DELTAS[action][1]
+            inside = 0 <= new_row < rows and 0 <= new_col < cols
+            cells.append(new_row * cols + new_col if inside else -1)
+        result.append(cells)
+    return result
+
+def goal(rows, cols):
+    '''Returns the flat goal board: 1, 2, ..., then the empty slot.'''
+    return list(range(1, rows * cols)) + [0]
+
+def encode(solutions):
+    '''Returns (moves, lengths) for the list of action lists SOLUTIONS:
+    MOVES is a uint8 array of shape (N, ceil(longest / 4)) and LENGTHS
+    holds the number of actions of each solution.'''
+    lengths = np.array([len(solution) for solution in solutions], dtype=np.int64)
+    longest = int(lengths.max()) if len(solutions) else 0
+    codes = np.zeros((len(solutions), 4 * ((longest + 3) // 4)), dtype=np.uint8)
+    index = {action: i for i, action in enumerate(ACTIONS)}
+    for row, solution in enumerate(solutions):
+        for action in solution:
+            assert action in index, "Invalid action: '{}'".format(action)
+        codes[row, :len(solution)] = [index[action] for action in solution]
+    codes = codes.reshape(len(solutions), codes.shape[1] // 4, 4)
+    moves = codes[:, :, 0] | codes[:, :, 1] << 2 | codes[:, :, 2] << 4 | codes[:, :, 3] << 6
+    return moves.astype(np.uint8), lengths
+
+def decode(moves, lengths, row):
+    '''Returns solution number ROW of (MOVES, LENGTHS) as a list of actions.'''
+    return [ACTIONS[(int(moves[row, t >> 2]) >> 2 * (t & 3)) & 3] for t in range(int(lengths[row]))]
+
+def validate(boards, moves, lengths, rows, cols):
+    '''Plays the encoded solutions (MOVES, LENGTHS) on BOARDS and returns
+    (legal, solved, failed_at) arrays:
+        legal:     True iff every action of the row was legal
+        solved:    True iff the row is legal and ends at the goal
+        failed_at: index of the first illegal action, or -1
+    BOARDS is not modified.'''
+    cells = np.array(targets(rows, cols), dtype=np.intp)
+    n = len(boards)
+    tiles = np.array(boards, dtype=np.uint8).reshape(n, rows * cols)
+    zero = np.argmin(tiles, axis=1)
+    failed_at = np.full(n, -1, dtype=np.int64)
+    longest = int(lengths.max()) if n else 0
+    for t in range(longest):
+        active = np.nonzero((t < lengths) & (failed_at < 0))[0]
+        if len(active) == 0:
+            break
+        action = (moves[active, t >> 2] >> 2 * (t & 3)) & 3
+        new_zero = cells[zero[active], action]
+        illegal = new_zero < 0
+        failed_at[active[illegal]] = t
+        active, new_zero = active[~illegal], new_zero[~illegal]
+        tiles[active, zero[active]] = tiles[active, new_zero]
+        tiles[active, new_zero] = 0
+        zero[active] = new_zero
+    legal = failed_at < 0
+    solved = legal & (tiles == np.array(goal(rows, cols), dtype=np.uint8)).all(axis=1)
+    return legal, solved, failed_at
+
+def transitions(board, solution, rows, cols):
+    '''Returns [[tiles, action], ...] for the flat BOARD and each action of
+    SOLUTION it can legally take, starting with [BOARD, None]. Only meant
+    for the few rows validate() reports as failed.'''
+    cells = targets(rows, cols)
+    tiles = [int(tile) for tile in board]
+    zero = tiles.index(0)
+    result = [[tiles[:], None]]
+    for action in solution:
+        new_zero = cells[zero][ACTIONS.index(action)]
+        if new_zero < 0:
+            break
+        tiles[zero], tiles[new_zero] = tiles[new_zero], 0
+        zero = new_zero
+        result.append([tiles[:], action])
+    return result
+
+def failures(boards, moves, lengths, rows, cols):
+    '''Validates the solutions and yields (row, transitions) for every row
+    that is illegal or does not reach the goal.'''
+    legal, solved, failed_at = validate(boards, moves, lengths, rows, cols)
+    for row in np.nonzero(~solved)[0]:
+        yield int(row), transitions(boards[row], decode(moves, lengths, row), rows, cols)